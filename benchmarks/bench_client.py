@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Client benchmark suite: signing, request encoding and response parsing
+in process, then end-to-end throughput of DescribeInstances and
+CreateInstance against the local stub server.
+
+    python benchmarks/bench_client.py [-n COUNT] [--threads N ...]
+                                      [--latency SECONDS] [--format FMT]
+
+Every request sent to the stub is signature checked, so a signing
+regression fails the end-to-end section instead of speeding it up.
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import stubserver
+
+from mosclient.common.xmltodict import unparse
+from mosclient.v1.client import Client
+
+
+class CannedResponse(object):
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.headers = {'Content-Type': content_type}
+        self.pos = 0
+
+    def read(self, amt=None):
+        start = self.pos
+        end = len(self.body) if amt is None else start + amt
+        self.pos = min(end, len(self.body))
+        return self.body[start:self.pos]
+
+
+def rate(fn, count):
+    start = time.time()
+    for _ in xrange(count):
+        fn()
+    return count / (time.time() - start)
+
+
+def bench_local(client, count):
+    print 'in process (ops/s)'
+    kwargs = {'Limit': 100, 'Offset': 200,
+              'InstanceId': ['i-%d' % i for i in range(10)]}
+    print '  %-36s %10.0f' % ('sign DescribeInstances, 10 ids',
+                              rate(lambda: client.build_params(
+                                  'DescribeInstances', kwargs), count))
+    print '  %-36s %10.0f' % ('sign and encode',
+                              rate(lambda: client.encode_request(
+                                  'DescribeInstances', kwargs), count))
+    for nitems in (10, 100):
+        body = {'DescribeInstancesResponse': {'InstanceSet': {
+            'Total': nitems, 'Limit': nitems, 'Offset': 0,
+            'Instance': [stubserver.make_instance(i)
+                         for i in range(nitems)]}}}
+        for fmt, data, content_type in (
+                ('xml', unparse(body).encode('utf-8'), 'application/xml'),
+                ('json', json.dumps(body), 'application/json')):
+            ops = rate(lambda: client.parse_response(
+                'DescribeInstances', CannedResponse(data, content_type)),
+                max(1, count / nitems))
+            print '  %-36s %10.0f' % ('parse %d instances, %s' %
+                                      (nitems, fmt), ops)
+
+
+def run_threads(fn, threads, count):
+    """Run fn count times on threads threads, returns (seconds, latencies)"""
+    latencies = []
+    lock = threading.Lock()
+    remaining = [count]
+
+    def worker():
+        own = []
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            start = time.time()
+            fn()
+            own.append(time.time() - start)
+        with lock:
+            latencies.extend(own)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.time()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.time() - start, sorted(latencies)
+
+
+def bench_end_to_end(server, args):
+    print 'end to end against %s, latency %.3fs, %s' % \
+        (server.url, args.latency, args.format)
+    print '  %-36s %7s %10s %10s %10s' % ('', 'threads', 'req/s',
+                                          'p50 ms', 'p99 ms')
+    for threads in args.threads:
+        client = Client(stubserver.ACCESS, stubserver.SECRET, server.url,
+                        format=args.format, pool_size=threads,
+                        raise_errors=True)
+        cases = [
+            ('DescribeInstances, 100 per page',
+             lambda: client.DescribeInstances(limit=100)),
+            ('DescribeInstances, 10 ids',
+             lambda: client.DescribeInstances(ids=ids)),
+            ('CreateInstance',
+             lambda: client.CreateInstance('image', 'C1_M2', name='bench')),
+        ]
+        ids = [i['instanceId'] for i in
+               client.DescribeInstances(limit=10)['Instance']]
+        for title, fn in cases:
+            count = max(threads, args.requests)
+            errors = server.counts.get('errors', 0)
+            seconds, latencies = run_threads(fn, threads, count)
+            if server.counts.get('errors', 0) != errors:
+                raise SystemExit('%s: the stub rejected requests' % title)
+            print '  %-36s %7d %10.0f %10.2f %10.2f' % (
+                title, threads, count / seconds,
+                latencies[len(latencies) / 2] * 1000,
+                latencies[int(len(latencies) * 0.99)] * 1000)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--count', type=int, default=5000,
+                        help='Iterations of the in-process measurements')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='Requests per end-to-end measurement')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds the stub adds to every response')
+    parser.add_argument('--format', choices=['xml', 'json'],
+                        default='json')
+    parser.add_argument('--skip-local', action='store_true')
+    args = parser.parse_args()
+
+    server = stubserver.start(latency=args.latency, instances=1000)
+    if not args.skip_local:
+        bench_local(Client(stubserver.ACCESS, stubserver.SECRET, server.url,
+                           format=args.format), args.count)
+    bench_end_to_end(server, args)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Decode cost of XML against JSON for representative *Set list responses.
+
+    python benchmarks/bench_decode.py [-n COUNT] [--items N ...]
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+import collections
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mosclient.common import client
+from mosclient.common.xmltodict import parse, unparse
+
+
+def sample_instance(i):
+    return {
+        'instanceId': 'b7a35e1f-0c2d-4f5a-9a9e-%012d' % i,
+        'instanceName': 'web-%05d' % i,
+        'instanceType': 'C2_M4',
+        'status': 'running',
+        'availabilityZoneId': 'cn-north-1a',
+        'ipAddresses': '10.0.%d.%d' % (i / 250, i % 250),
+        'imageId': '8e76df8f-3476-4eed-8469-ed22daa1334c',
+        'keypairName': 'ops',
+        'creationTime': '2017-12-08T10:00:00Z',
+        'expireAt': '2018-01-08T10:00:00Z',
+    }
+
+
+def sample_payloads(nitems):
+    body = {
+        'DescribeInstancesResponse': {
+            'InstanceSet': {
+                'Total': nitems,
+                'Limit': nitems,
+                'Offset': 0,
+                'Instance': [sample_instance(i) for i in range(nitems)],
+            }
+        }
+    }
+    return unparse(body).encode('utf-8'), json.dumps(body)
+
+
+def measure(fn, count):
+    start = time.time()
+    for _ in xrange(count):
+        fn()
+    return (time.time() - start) / count * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--count', type=int, default=20)
+    parser.add_argument('--items', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    client_json = client._get_json()
+    ordered = collections.OrderedDict
+    print 'json decoder used by the client: %s, with OrderedDict objects' % \
+        client_json.__name__
+    for nitems in args.items:
+        xml_body, json_body = sample_payloads(nitems)
+        results = [
+            ('xmltodict', measure(lambda: parse(xml_body), args.count)),
+            ('json', measure(lambda: json.loads(json_body), args.count)),
+        ]
+        if client_json is not json:
+            results.append((client_json.__name__,
+                            measure(lambda: client_json.loads(json_body),
+                                    args.count)))
+        # what decode_body does
+        results.append(('client', measure(
+            lambda: client_json.loads(json_body, object_pairs_hook=ordered),
+            args.count)))
+        print '%5d items (xml %d bytes, json %d bytes)' % \
+            (nitems, len(xml_body), len(json_body))
+        for name, ms in results:
+            print '    %-12s %9.3f ms  x%.1f' % (name, ms, results[0][1] / ms)
+
+
+if __name__ == '__main__':
+    main()
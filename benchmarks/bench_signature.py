@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Signatures per second: per-request signer construction (the previous
+BaseClient.get_signature) against the client cached, prekeyed signer.
+
+    python benchmarks/bench_signature.py [-n COUNT]
+"""
+
+import os
+import sys
+import time
+import base64
+import hashlib
+import hmac
+import urllib
+import argparse
+
+from urlparse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mosclient.common.client import BaseClient
+
+
+def legacy_signature(url, secret, params):
+    req = urlparse(url)
+    host = req.netloc
+    path = req.path or '/'
+    hmac.new(secret, digestmod=hashlib.sha1)
+    hmac_256 = hmac.new(secret, digestmod=hashlib.sha256)
+    string_to_sign = '%s\n%s\n%s\n' % ('POST', host, path)
+    keys = params.keys()
+    keys.sort()
+    pairs = []
+    for key in keys:
+        val = params[key]
+        if not isinstance(val, basestring):
+            val = str(val)
+        if isinstance(val, unicode):
+            val = val.encode('utf-8')
+        val = urllib.quote(val, safe='-_~')
+        pairs.append(urllib.quote(key, safe='') + '=' + val)
+    string_to_sign += '&'.join(pairs)
+    hmac_256.update(string_to_sign)
+    return base64.b64encode(hmac_256.digest())
+
+
+def sample_params(nids):
+    params = {
+        'Action': 'DescribeInstances',
+        'AWSAccessKeyId': '4ba303cc17454cc7904e044db2a3c912',
+        'Timestamp': '2017-12-08T10:00:00.000Z',
+        'SignatureVersion': '2',
+        'SignatureMethod': 'HmacSHA256',
+        'Region': 'Beijing',
+        'Limit': 100,
+        'Offset': 200,
+        'Filter.1.Name': 'status',
+        'Filter.1.Value.1': 'running',
+    }
+    for i in range(nids):
+        params['InstanceId.%d' % (i + 1)] = 'b7a35e1f-0c2d-4f5a-9a9e-%012d' % i
+    return params
+
+
+def measure(fn, count):
+    start = time.time()
+    for _ in xrange(count):
+        fn()
+    return count / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--count', type=int, default=20000)
+    args = parser.parse_args()
+
+    url = 'https://mosapi.meituan.com/mcs/v1'
+    secret = '2952f821201341a38978ac4a4a292ce8'
+    client = BaseClient('4ba303cc17454cc7904e044db2a3c912', secret, url)
+    for nids in (0, 10, 100):
+        params = sample_params(nids)
+        assert legacy_signature(url, secret, dict(params)) == \
+            client.get_signature(dict(params))
+        before = measure(lambda: legacy_signature(url, secret, params),
+                         args.count)
+        after = measure(lambda: client.get_signature(params), args.count)
+        print '%3d ids: before %8.0f sig/s  after %8.0f sig/s  x%.2f' % \
+            (nids, before, after, after / before)
+
+
+if __name__ == '__main__':
+    main()
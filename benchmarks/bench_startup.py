@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Startup cost of climos: building the subcommand parsers in process, and
+the wall time of representative commands run as fresh interpreters.
+
+    python benchmarks/bench_startup.py [-n COUNT]
+
+GetBalance is sent to the local stub server, so no credentials are needed.
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import stubserver
+
+from mosclient.shell import APIShell
+
+COMMANDS = [
+    ['help'],
+    ['help', 'DescribeInstances'],
+    ['GetBalance'],
+]
+
+
+def measure(fn, count):
+    times = []
+    for _ in range(count):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    times.sort()
+    return times[len(times) / 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-n', '--count', type=int, default=10,
+                        help='Runs per measurement, the median is shown')
+    args = parser.parse_args()
+
+    shell = APIShell()
+    shell.get_command_index('1')
+    full = measure(lambda: shell.get_subcommand_parser('1'), args.count)
+    lazy = measure(lambda: shell.get_subcommand_parser('1', ['GetBalance']),
+                   args.count)
+    print 'parser build, all %d subcommands: %8.2f ms' % \
+        (len(shell.get_command_index('1')), full * 1000)
+    print 'parser build, invoked subcommand: %8.2f ms' % (lazy * 1000)
+
+    server = stubserver.start()
+    env = dict(os.environ, MOS_ACCESS=stubserver.ACCESS,
+               MOS_SECRET=stubserver.SECRET, MOS_URL=server.url,
+               PYTHONPATH=ROOT)
+    climos = os.path.join(ROOT, 'climos')
+    with open(os.devnull, 'w') as devnull:
+        for command in COMMANDS:
+            def run():
+                subprocess.check_call([sys.executable, climos] + command,
+                                      env=env, stdout=devnull)
+            print 'climos %-28s %8.2f ms' % \
+                (' '.join(command), measure(run, args.count) * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Import cost of the SDK and climos, and a check that heavy optional
+modules stay unloaded on code paths that do not need them.
+
+    python benchmarks/check_imports.py [--top N]
+
+Every scenario runs in a fresh interpreter with __import__ wrapped to
+time each import, like -X importtime of later Pythons: self time
+excludes nested imports, cumulative time includes them. Exits with
+status 1 if a scenario loads one of its forbidden modules.
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# modules only needed to print tables, decrypt passwords, decode JSON or
+# XML bodies, or parse Retry-After dates; the HTTP modules every request
+# uses are imported up front
+HEAVY = ['prettytable', 'Crypto', 'json', 'simplejson', 'xml.sax',
+         'email', 'inspect']
+
+SCENARIOS = [
+    ('import mosclient.client',
+     'import mosclient.client', HEAVY),
+    ('create a v1 Client',
+     'from mosclient.v1.client import Client\n'
+     'Client("access", "secret", "http://127.0.0.1/mcs/v1")', HEAVY),
+    ('climos help GetBalance',
+     'from mosclient.shell import APIShell\n'
+     'APIShell().main(["help", "GetBalance"])', HEAVY),
+]
+
+
+def child(code):
+    import time
+    import __builtin__
+
+    real_import = __builtin__.__import__
+    stack = []
+    timings = {}
+
+    def timed_import(name, *args, **kwargs):
+        if name in timings or name in sys.modules:
+            return real_import(name, *args, **kwargs)
+        stack.append(0.0)
+        start = time.time()
+        try:
+            return real_import(name, *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            timings[name] = (elapsed - nested, elapsed)
+
+    __builtin__.__import__ = timed_import
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            exec compile(code, '<scenario>', 'exec') in {}
+        finally:
+            sys.stdout = stdout
+    __builtin__.__import__ = real_import
+    modules = [m for m in sys.modules if sys.modules[m]]
+    # json only now, it is one of the modules under test
+    import json
+    json.dump({'modules': modules, 'timings': timings}, sys.stdout)
+
+
+def run(code):
+    import json
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.check_output([sys.executable, __file__,
+                                   '--child', code], env=env)
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--top', type=int, default=10,
+                        help='Slowest imports to show per scenario')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        return child(args.child)
+
+    failed = False
+    for title, code, forbidden in SCENARIOS:
+        result = run(code)
+        timings = sorted(result['timings'].items(),
+                         key=lambda item: -item[1][1])
+        total = sum(t[0] for _, t in timings)
+        print '%s: %d modules, %.1f ms importing' % \
+            (title, len(result['modules']), total * 1000)
+        print '  %10s %10s  %s' % ('self [us]', 'cumul [us]', 'module')
+        for name, (own, cumulative) in timings[:args.top]:
+            print '  %10d %10d  %s' % (own * 1e6, cumulative * 1e6, name)
+        loaded = [m for m in result['modules']
+                  if any(m == f or m.startswith(f + '.') for f in forbidden)]
+        if loaded:
+            failed = True
+            print '  FAIL: loaded %s' % ', '.join(sorted(loaded))
+        print
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
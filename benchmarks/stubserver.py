@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""
+Local stub of the MOS v1 API for offline benchmarks.
+
+    python benchmarks/stubserver.py [--port 8000] [--latency SECONDS]
+
+Requests are POSTed form parameters signed with signature version 2, the
+signature is checked against the configured access key and secret. XML
+or JSON responses are returned according to the Format parameter. A
+handful of instance actions are implemented over an in-memory inventory,
+with Total/Limit/Offset pagination; other actions fail with 400.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import base64
+import random
+import urllib
+import hashlib
+import argparse
+import threading
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mosclient.common.xmltodict import unparse
+
+ACCESS = 'stub-access'
+SECRET = 'stub-secret'
+
+
+def sign(secret, host, path, params):
+    """Signature version 2, HmacSHA256, of a POST request."""
+    pairs = []
+    for key in sorted(params):
+        pairs.append('%s=%s' % (urllib.quote(key, safe='-_.~'),
+                                urllib.quote(params[key], safe='-_.~')))
+    string_to_sign = 'POST\n%s\n%s\n%s' % (host, path, '&'.join(pairs))
+    digest = hmac.new(secret, string_to_sign, hashlib.sha256).digest()
+    return base64.b64encode(digest)
+
+
+def make_instance(i, name=None, itype='C1_M2', status='running'):
+    return {
+        'instanceId': 'b7a35e1f-0c2d-4f5a-9a9e-%012d' % i,
+        'instanceName': name or 'stub-%05d' % i,
+        'instanceType': itype,
+        'status': status,
+        'availabilityZoneId': 'cn-north-1a',
+        'ipAddresses': '10.0.%d.%d' % (i / 250 % 256, i % 250),
+        'imageId': '8e76df8f-3476-4eed-8469-ed22daa1334c',
+        'creationTime': '2017-12-08T10:00:00Z',
+        'expireAt': '2018-01-08T10:00:00Z',
+    }
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, code, message):
+        super(ApiError, self).__init__(message)
+        self.status = status
+        self.code = code
+
+
+class StubApi(object):
+    """The actions, over an in-memory list of instances."""
+
+    def __init__(self, instances=1000):
+        self.lock = threading.Lock()
+        self.instances = [make_instance(i) for i in range(instances)]
+        self.next_id = instances
+        self.index = dict((inst['instanceId'], inst)
+                          for inst in self.instances)
+
+    @staticmethod
+    def get_list(params, prefix):
+        values = []
+        i = 1
+        while '%s.%d' % (prefix, i) in params:
+            values.append(params['%s.%d' % (prefix, i)])
+            i += 1
+        if prefix in params:
+            values.append(params[prefix])
+        return values
+
+    def get_instance(self, params):
+        inst = self.index.get(params.get('InstanceId'))
+        if inst is None:
+            raise ApiError(404, 'InvalidInstanceID.NotFound',
+                           'Instance %s not found' %
+                           params.get('InstanceId'))
+        return inst
+
+    def DescribeInstances(self, params):
+        ids = self.get_list(params, 'InstanceId')
+        limit = int(params.get('Limit') or 0)
+        offset = int(params.get('Offset') or 0)
+        with self.lock:
+            if ids:
+                items = [self.index[i] for i in ids if i in self.index]
+            else:
+                items = self.instances
+            total = len(items)
+            if limit:
+                items = items[offset:offset + limit]
+            else:
+                items = items[offset:]
+        return {'InstanceSet': {'Total': total, 'Limit': limit,
+                                'Offset': offset, 'Instance': items}}
+
+    def CreateInstance(self, params):
+        for name in ('ImageId', 'InstanceType'):
+            if not params.get(name):
+                raise ApiError(400, 'MissingParameter',
+                               'The request must contain %s' % name)
+        with self.lock:
+            inst = make_instance(self.next_id,
+                                 name=params.get('InstanceName'),
+                                 itype=params['InstanceType'],
+                                 status='pending')
+            self.next_id += 1
+            self.instances.append(inst)
+            self.index[inst['instanceId']] = inst
+        return {'Instance': inst}
+
+    def DescribeInstanceStatus(self, params):
+        return {'InstanceStatus': self.get_instance(params)['status']}
+
+    def _set_status(self, params, status):
+        self.get_instance(params)['status'] = status
+        return {'return': 'true'}
+
+    def StartInstance(self, params):
+        return self._set_status(params, 'running')
+
+    def StopInstance(self, params):
+        return self._set_status(params, 'ready')
+
+    def RebootInstance(self, params):
+        return self._set_status(params, 'running')
+
+    def TerminateInstance(self, params):
+        inst = self.get_instance(params)
+        with self.lock:
+            self.instances.remove(inst)
+            del self.index[inst['instanceId']]
+        return {'return': 'true'}
+
+    def GetBalance(self, params):
+        return {'balance': '1000.00', 'lastUpdate': '2017-12-08T10:00:00Z'}
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # buffer the status line and headers, and send without Nagle: small
+    # trailing segments otherwise wait for the client's delayed ACK
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, *args)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        params = dict(urlparse.parse_qsl(self.rfile.read(length),
+                                         keep_blank_values=True))
+        server = self.server
+        if server.latency:
+            time.sleep(random.uniform(0, 2 * server.latency)
+                       if server.jitter else server.latency)
+        action = params.get('Action', '')
+        fmt = params.get('Format', 'xml')
+        try:
+            self.check_signature(params)
+            handler = getattr(server.api, action, None)
+            if handler is None or action.startswith('_') or \
+                    not action[:1].isupper():
+                raise ApiError(400, 'InvalidAction',
+                               'Unknown action %s' % action)
+            body = handler(params)
+        except ApiError, e:
+            server.count('errors')
+            error = {'Error': {'Code': e.code, 'Message': str(e)}}
+            return self.reply(e.status, {'ErrorResponse': error}, fmt)
+        server.count(action)
+        self.reply(200, {'%sResponse' % action: body}, fmt)
+
+    def check_signature(self, params):
+        if not self.server.check_signature:
+            return
+        if params.get('AWSAccessKeyId') != self.server.access:
+            raise ApiError(403, 'AuthFailure', 'Unknown access key')
+        signature = params.pop('Signature', None)
+        path = urlparse.urlparse(self.path).path or '/'
+        expected = sign(self.server.secret, self.headers.get('Host', ''),
+                        path, params)
+        if signature != expected:
+            raise ApiError(403, 'SignatureDoesNotMatch',
+                           'The request signature does not match')
+
+    def reply(self, status, body, fmt):
+        if fmt == 'json':
+            data = json.dumps(body)
+            content_type = 'application/json'
+        else:
+            data = unparse(body).encode('utf-8')
+            content_type = 'application/xml'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Threaded, keep-alive stub server.
+
+    :param latency: seconds added to every response
+    :param jitter: draw the added latency uniformly from [0, 2 * latency]
+    :param instances: size of the initial inventory
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), access=ACCESS,
+                 secret=SECRET, latency=0, jitter=False, instances=1000,
+                 check_signature=True, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, StubHandler)
+        self.access = access
+        self.secret = secret
+        self.latency = latency
+        self.jitter = jitter
+        self.check_signature = check_signature
+        self.verbose = verbose
+        self.api = StubApi(instances)
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://%s:%d/mcs/v1' % self.server_address
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+def start(**kwargs):
+    """Serve in a daemon thread, returns the StubServer, see its url."""
+    server = StubServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--access', default=ACCESS)
+    parser.add_argument('--secret', default=SECRET)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds added to every response')
+    parser.add_argument('--jitter', action='store_true',
+                        help='Randomize the added latency')
+    parser.add_argument('--instances', type=int, default=1000)
+    parser.add_argument('--no-check-signature', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = StubServer((args.host, args.port), access=args.access,
+                        secret=args.secret, latency=args.latency,
+                        jitter=args.jitter, instances=args.instances,
+                        check_signature=not args.no_check_signature,
+                        verbose=args.verbose)
+    print 'export MOS_URL=%s MOS_ACCESS=%s MOS_SECRET=%s' % \
+        (server.url, args.access, args.secret)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -19,3 +19,9 @@ def Client(version, *args, **kwargs):
     module = utils.import_versioned_module(version, 'client')
     client_class = getattr(module, 'Client')
     return client_class(*args, **kwargs)
+
+
+def AsyncClient(version, *args, **kwargs):
+    module = utils.import_versioned_module(version, 'client')
+    client_class = getattr(module, 'AsyncClient')
+    return client_class(*args, **kwargs)
@@ -0,0 +1,92 @@
+import threading
+
+from functools import wraps
+
+
+# actions starting with these only read state
+READONLY_PREFIXES = ('Describe', 'Get', 'List', 'Search')
+
+
+class Action(object):
+    """Metadata of an API action.
+
+    :param name: API action name, e.g. DescribeInstances
+    :param readonly: whether it only reads state and is safe to repeat,
+                     guessed from the name prefix when None
+    :param item_key: element name of the items of a paginated list action
+    :param ids_arg: argument of a list action taking a list of IDs
+    """
+    __slots__ = ('name', 'readonly', 'item_key', 'ids_arg', 'response_key')
+
+    def __init__(self, name, readonly=None, item_key=None, ids_arg=None):
+        self.name = name
+        if readonly is None:
+            readonly = name.startswith(READONLY_PREFIXES)
+        self.readonly = readonly
+        self.item_key = item_key
+        self.ids_arg = ids_arg
+        self.response_key = '%sResponse' % name
+
+    def __repr__(self):
+        return '<Action %s>' % self.name
+
+
+class ActionLocal(threading.local):
+    """Per thread state of a client: the stack of running actions."""
+
+    def __init__(self):
+        self.actions = []
+
+
+def action(name=None, readonly=None, item_key=None, ids_arg=None):
+    """Declare a client method as an API action.
+
+    While the method runs, its Action is the current one of the client in
+    the calling thread, so request() knows the action it sends without
+    inspecting stack frames. Nested actions, e.g. a wait helper polling
+    DescribeInstances, push onto a per thread stack.
+
+    >>> class MyClient(BaseClient):
+    ...     @action(item_key='Widget')
+    ...     def DescribeWidgets(self, limit=0, offset=0):
+    ...         return self.request(Limit=limit, Offset=offset)
+    """
+    def decorator(func):
+        spec = Action(name or func.__name__, readonly, item_key, ids_arg)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            stack = self._local.actions
+            stack.append(spec)
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                stack.pop()
+        wrapper.__wrapped__ = func
+        wrapper.action = spec
+        return wrapper
+    return decorator
+
+
+def register_actions(cls, item_keys=None, ids_args=None):
+    """Declare every method of cls named like an action, i.e. starting
+    with an upper case letter, and collect them into cls.actions
+
+    :param item_keys: dict of list action name -> element name of items
+    :param ids_args: dict of list action name -> argument taking IDs
+    """
+    item_keys = item_keys or {}
+    ids_args = ids_args or {}
+    actions = {}
+    for base in reversed(cls.__mro__):
+        actions.update(getattr(base, 'actions', None) or {})
+    for name, func in cls.__dict__.items():
+        if not name[:1].isupper() or not callable(func):
+            continue
+        if getattr(func, 'action', None) is None:
+            func = action(item_key=item_keys.get(name),
+                          ids_arg=ids_args.get(name))(func)
+            setattr(cls, name, func)
+        actions[func.action.name] = func.action
+    cls.actions = actions
+    return cls
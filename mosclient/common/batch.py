@@ -0,0 +1,87 @@
+import sys
+
+from futures import ThreadPoolExecutor
+
+
+class BatchResult(object):
+    """Outcome of one item of a batch.
+
+    :ivar key: the item, e.g. an instance ID
+    :ivar result: return value of the call when it succeeded
+    :ivar error: error message when it failed, None otherwise
+    :ivar exc_info: sys.exc_info() of the failure
+    """
+
+    def __init__(self, key, result=None, error=None, exc_info=None):
+        self.key = key
+        self.result = result
+        self.error = error
+        self.exc_info = exc_info
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return '<BatchResult %s ok>' % self.key
+        return '<BatchResult %s error: %s>' % (self.key, self.error)
+
+
+class BatchSummary(object):
+    """Results of a batch, in input order."""
+
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def to_list(self):
+        return [{'id': r.key,
+                 'status': 'ok' if r.ok else 'error',
+                 'error': r.error or ''} for r in self.results]
+
+    def __str__(self):
+        return 'Total: %d Succeeded: %d Failed: %d' % \
+            (len(self.results), len(self.succeeded), len(self.failed))
+
+
+def run_batch(fn, keys, workers=10, describe_error=str):
+    """Call fn(key) for every key on at most workers threads.
+
+    Failures are recorded per item instead of aborting the batch.
+
+    :param describe_error: turns a caught exception into the message
+                           stored in BatchResult.error
+    :returns: BatchSummary
+    """
+    def call(key):
+        try:
+            return BatchResult(key, result=fn(key))
+        except Exception, e:
+            return BatchResult(key, error=describe_error(e),
+                               exc_info=sys.exc_info())
+
+    keys = list(keys)
+    executor = ThreadPoolExecutor(max(1, min(workers, len(keys))))
+    try:
+        futures = [executor.submit(call, key) for key in keys]
+        return BatchSummary([f.result() for f in futures])
+    finally:
+        executor.shutdown(wait=False)
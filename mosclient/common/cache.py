@@ -0,0 +1,140 @@
+import os
+import time
+import errno
+import hashlib
+import threading
+import cPickle as pickle
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """In-memory, thread safe LRU of (expires, data) entries."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                return None
+            self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, prefix=''):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+
+class DiskCache(object):
+    """One file per entry under path, survives across processes."""
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        try:
+            os.makedirs(self.path, 0o700)
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.cache')
+
+    def get(self, key):
+        try:
+            with open(self._filename(key), 'rb') as f:
+                entry = pickle.load(f)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        if entry[0] < time.time():
+            return None
+        return entry
+
+    def set(self, key, entry):
+        import tempfile
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, self._filename(key))
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, prefix=''):
+        for name in os.listdir(self.path):
+            if name.startswith(prefix) and name.endswith('.cache'):
+                try:
+                    os.unlink(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+
+class ResponseCache(object):
+    """TTL cache of API results.
+
+    Results are looked up in an in-memory LRU first, then in the optional
+    on-disk store. Keys cover the endpoint URL, region, access key, format,
+    action and parameters, so clients for different accounts or regions
+    never share entries. Values are stored pickled, every hit returns a
+    fresh copy the caller may modify.
+
+    :param ttls: action name -> seconds, only these actions are cached,
+                 defaults to the client's cache_ttls
+    :type ttls: dict
+    :param maxsize: max entries of the in-memory LRU
+    :type maxsize: int
+    :param path: directory of the on-disk store, None to keep it in memory
+    :type path: string
+    """
+
+    def __init__(self, ttls=None, maxsize=256, path=None):
+        self.ttls = ttls
+        self.memory = LRUCache(maxsize)
+        if path:
+            self.disk = DiskCache(path)
+        else:
+            self.disk = None
+
+    @staticmethod
+    def make_key(scope, action, params):
+        digest = hashlib.sha1(repr((scope, sorted(params.items()))))
+        return '%s-%s' % (action, digest.hexdigest())
+
+    def get(self, key):
+        """Return the cached value of key, None on a miss."""
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        if entry is None:
+            return None
+        return pickle.loads(entry[1])
+
+    def set(self, key, value, ttl):
+        entry = (time.time() + ttl,
+                 pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+
+    def invalidate(self, action=None):
+        """Drop the entries of action, or every entry if action is None."""
+        prefix = '' if action is None else action + '-'
+        self.memory.delete(prefix)
+        if self.disk is not None:
+            self.disk.delete(prefix)
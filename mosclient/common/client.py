@@ -1,19 +1,71 @@
 import sys
-import json
+import itertools
+import contextlib
+import collections
+import time
+import threading
+import socket
+import httplib
 import urllib
 import urllib2
 
 from urlparse import urlparse
 from datetime import datetime
+from xml.parsers.expat import ExpatError
 
 import ec2utils
-from xmltodict import parse
+from actions import READONLY_PREFIXES, ActionLocal
+from records import convert as convert_records, make_postprocessor
+from batch import run_batch
+from cache import ResponseCache
+from futures import ThreadPoolExecutor
+from hooks import Hooks
+from metrics import MetricsCollector
+from retry import RetryPolicy
+from singleflight import SingleFlight
+from transport import PooledTransport, UrllibTransport
+from xmltodict import parse, parse_chunks, iterparse
+
+# bytes read per chunk when an XML body is fed to the parser
+READ_CHUNK_SIZE = 65536
+
+# error bodies are read up to this size, longer ones are cut and their
+# connection dropped instead of drained
+MAX_ERROR_BODY = 65536
+
+_json = None
+
+
+def _get_json():
+    """ simplejson if installed, C accelerated and faster than the stdlib
+    json on Python 2, imported when the first JSON body is decoded """
+    global _json
+    if _json is None:
+        try:
+            import simplejson as json
+        except ImportError:
+            import json
+        _json = json
+    return _json
 
 
 class BaseClient(object):
 
-    def __init__(self, access, secret, url, format=None,
-                 timeout=300, debug=False, region='Beijing'):
+    # element name -> Record class, used when records=True
+    record_types = {}
+
+    # action name -> Action, see mosclient.common.actions.register_actions
+    actions = {}
+
+    # action -> seconds its result may be served from the cache
+    cache_ttls = {}
+
+    def __init__(self, access, secret, url, format='json',
+                 timeout=300, debug=False, region='Beijing',
+                 keepalive=True, pool_size=10, idle_timeout=60,
+                 transport=None, records=False, retry=None,
+                 rate_limiter=None, raise_errors=False, cache=None,
+                 metrics=None, coalesce=False):
         self.access = access
         self.secret = secret
         self.url = url
@@ -21,8 +73,51 @@ class BaseClient(object):
         self.timeout = timeout
         self.debug = debug
         self.region = region
+        if transport is None:
+            if keepalive:
+                transport = PooledTransport(pool_size=pool_size,
+                                            idle_timeout=idle_timeout)
+            else:
+                transport = UrllibTransport()
+        self.transport = transport
+        if retry is None:
+            retry = RetryPolicy()
+        elif retry is False:
+            retry = RetryPolicy(max_attempts=1)
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.raise_errors = raise_errors
+        if cache is True:
+            cache = ResponseCache()
+        self.cache = cache
+        self.hooks = Hooks()
+        if metrics is True:
+            metrics = MetricsCollector()
+        if metrics is not None:
+            metrics.attach(self)
+        self.metrics = metrics
+        self.single_flight = SingleFlight() if coalesce else None
+        self._local = ActionLocal()
+        self._retries = {}
+        self._retries_lock = threading.Lock()
+        self.records = records
+        if records:
+            self._postprocessor = make_postprocessor(self.record_types)
+
+    def close(self):
+        """ Release idle connections held by the transport """
+        self.transport.close()
+
+    def current_action(self):
+        """ Action of the innermost action method running in this thread,
+        None outside of action methods """
+        stack = self._local.actions
+        if stack:
+            return stack[-1]
 
     def _get_action(self, level):
+        # slow path for methods of subclasses not declared as actions:
+        # the action is the name of the calling method
         if getattr(sys, '_getframe', None) is not None:
             co = sys._getframe(level).f_code
             func = getattr(self, co.co_name, None)
@@ -31,15 +126,25 @@ class BaseClient(object):
         else:
             raise Exception('Cannot retrieve action name on this platform')
 
+    def _get_signer(self):
+        # the signer holds the prekeyed HMAC state, rebuild it only when
+        # the secret or the endpoint changes
+        cache_key = (self.secret, self.url)
+        if getattr(self, '_signer_key', None) != cache_key:
+            req = urlparse(self.url)
+            host = req.netloc
+            if (req.scheme == 'http' and host.endswith(':80')) or \
+                    (req.scheme == 'https' and host.endswith(':443')):
+                host = host[:host.rfind(':')]
+            path = req.path
+            if req.path == '':
+                path = '/'
+            self._signer = (ec2utils.Ec2Signer(self.secret), host, path)
+            self._signer_key = cache_key
+        return self._signer
+
     def get_signature(self, params):
-        req = urlparse(self.url)
-        host = req.netloc
-        if (req.scheme == 'http' and host.endswith(':80')) or \
-                (req.scheme == 'https' and host.endswith(':443')):
-            host = host[:host.rfind(':')]
-        path = req.path
-        if req.path == '':
-            path = '/'
+        signer, host, path = self._get_signer()
         cred_dict = {
             'access': self.access,
             'host': host,
@@ -47,11 +152,13 @@ class BaseClient(object):
             'path': path,
             'params': params,
         }
-        signer = ec2utils.Ec2Signer(self.secret)
         return signer.generate(cred_dict)
 
     def get_httperror(self, e, debug):
-        details = e.read()
+        details = e.read(MAX_ERROR_BODY)
+        if len(details) == MAX_ERROR_BODY and e.read(1):
+            e.close()
+            details += '...'
         if debug:
             print details
         try:
@@ -59,8 +166,7 @@ class BaseClient(object):
                 from common.xmltodict import parse
                 details = parse(details)
             else:
-                import json
-                details = json.loads(details)
+                details = _get_json().loads(details)
             if 'ErrorResponse' in details:
                 details = details['ErrorResponse']
             if 'Error' in details:
@@ -78,9 +184,10 @@ class BaseClient(object):
         return '%s(%d): %s' % (e.msg, e.code, details)
 
 
-    def _request(self, **kwargs):
+    def build_params(self, action, kwargs):
+        """ Build the signed parameter dict of an API call """
         params = {}
-        params['Action'] = self._get_action(3)
+        params['Action'] = action
         params['AWSAccessKeyId'] = self.access
         params['Timestamp'] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
         params['SignatureVersion'] = '2'
@@ -94,47 +201,349 @@ class BaseClient(object):
                     i += 1
             else:
                 params[k] = v
-        if self.format:
+        if self.format and 'Format' not in params:
             params['Format'] = self.format
+        self.hooks.emit('before-sign', client=self, action=action,
+                        params=params)
         sig = self.get_signature(params)
         params['Signature'] = sig
+        return params
+
+    def encode_request(self, action, kwargs):
+        """ Sign and encode an API call
+
+        :returns: (data, headers) ready to be passed to send()
+        """
+        params = self.build_params(action, kwargs)
         headers = {}
         headers['User-Agent'] = 'python-mosclient'
+        if params.get('Format') == 'json':
+            # servers without JSON support answer in XML, which
+            # parse_response handles by Content-Type
+            headers['Accept'] = 'application/json, application/xml;q=0.9'
         data = urllib.urlencode(params)
         if self.debug:
             print self.url + '?' + data
-        req = urllib2.Request(self.url, data, headers)
+        return data, headers
 
-        try:
-            resp = urllib2.urlopen(req, None, self.timeout)
-            return resp
-        except urllib2.HTTPError, e:
-            print self.get_httperror(e, self.debug)
-        except Exception, e:
-            raise e
+    def send(self, data, headers, idempotent=False):
+        """ Send an encoded request over the transport, once
+
+        :param idempotent: the transport may send it again if a reused
+                           connection fails before the response arrives
+        :returns: the raw response, HTTP errors are raised
+        """
+        return self.transport.send(self.url, data, headers, self.timeout,
+                                   idempotent)
+
+    def is_readonly(self, action):
+        """ Whether an action only reads state and is safe to repeat """
+        spec = self.actions.get(action)
+        if spec is not None:
+            return spec.readonly
+        return action.startswith(READONLY_PREFIXES)
+
+    def _count_retry(self, action):
+        with self._retries_lock:
+            self._retries[action] = self._retries.get(action, 0) + 1
 
+    def retry_stats(self):
+        """ Number of retries made per action
+
+        :returns: dict of action name -> retry count
+        """
+        with self._retries_lock:
+            return dict(self._retries)
+
+    def _do_request(self, action, kwargs):
+        readonly = self.is_readonly(action)
+        attempt = 1
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(action)
+            # signed again on every attempt, Timestamp must be fresh
+            data, headers = self.encode_request(action, kwargs)
+            self.hooks.emit('before-send', client=self, action=action,
+                            data=data, headers=headers, attempt=attempt)
+            start = time.time()
+            try:
+                resp = self.send(data, headers, readonly)
+                self.hooks.emit('after-response', client=self, action=action,
+                                status=getattr(resp, 'code', 200),
+                                elapsed=time.time() - start,
+                                bytes_out=len(data), error=None,
+                                attempt=attempt)
+                return resp
+            except urllib2.HTTPError, e:
+                self.hooks.emit('after-response', client=self, action=action,
+                                status=e.code, elapsed=time.time() - start,
+                                bytes_out=len(data), error=e,
+                                attempt=attempt)
+                delay = self.retry.get_status_delay(attempt, e.code,
+                                                    e.headers, readonly)
+                if delay is None:
+                    if self.raise_errors or \
+                            getattr(self._local, 'raise_errors', False):
+                        raise
+                    print self.get_httperror(e, self.debug)
+                    return
+                self.discard_body(e)
+            except (socket.error, httplib.HTTPException), e:
+                self.hooks.emit('after-response', client=self, action=action,
+                                status=None, elapsed=time.time() - start,
+                                bytes_out=len(data), error=e,
+                                attempt=attempt)
+                delay = self.retry.get_error_delay(attempt, readonly)
+                if delay is None:
+                    raise
+            if self.debug:
+                print 'Retrying %s in %.2f seconds (attempt %d)' % \
+                    (action, delay, attempt + 1)
+            self._count_retry(action)
+            time.sleep(delay)
+            attempt += 1
+
+    def _request(self, **kwargs):
+        spec = self.current_action()
+        if spec is not None:
+            return self._do_request(spec.name, kwargs)
+        return self._do_request(self._get_action(3), kwargs)
+
+    @staticmethod
+    def discard_body(resp):
+        """ Drain an unread body so its connection can be reused, bodies
+        longer than MAX_ERROR_BODY are not read, the connection is closed """
+        remaining = MAX_ERROR_BODY
+        while remaining > 0:
+            chunk = resp.read(min(remaining, READ_CHUNK_SIZE))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+        if resp.read(1):
+            resp.close()
+
+    def pool_stats(self):
+        """ Connection reuse counters of the transport
+
+        :returns: dict with created, reused, discarded and evicted counts
+        """
+        return self.transport.stats()
 
     def raw_request(self, **kwargs):
         return self._request(**kwargs)
 
-    def request(self, **kwargs):
-        resp = self._request(**kwargs)
+    def parse_response(self, action, resp):
+        """ Decode a raw response and unwrap <Action>Response """
         if not resp:
             return
-        body = resp.read()
-        if self.debug:
-            print resp.headers
-            print body
+        start = time.time()
+        content_type = resp.headers.get('Content-Type') or ''
+        if 'xml' in content_type and not self.debug:
+            result, bytes_in = self.decode_stream(action, resp)
+        else:
+            # the JSON decoder needs the whole body as one string
+            body = resp.read()
+            if self.debug:
+                print resp.headers
+                print body
+            result = self.decode_body(action, resp, body)
+            bytes_in = len(body)
+        self.hooks.emit('after-parse', client=self, action=action,
+                        elapsed=time.time() - start, bytes_in=bytes_in,
+                        result=result)
+        return result
+
+    def decode_stream(self, action, resp):
+        """ Feed an XML body to the parser READ_CHUNK_SIZE bytes at a time
+        and unwrap <Action>Response
+
+        A body that is not well-formed XML, e.g. the error page of a proxy,
+        is returned as a string like decode_body does, cut after
+        MAX_ERROR_BODY bytes like error bodies.
+
+        :returns: (result, bytes read)
+        """
+        # the start of the body, kept in case it turns out not to be XML
+        head = []
+        size = [0]
+
+        def chunks():
+            while True:
+                chunk = resp.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                if size[0] < MAX_ERROR_BODY:
+                    head.append(chunk[:MAX_ERROR_BODY - size[0]])
+                size[0] += len(chunk)
+                yield chunk
+        kwargs = {}
+        if self.records:
+            kwargs['postprocessor'] = self._postprocessor
+        try:
+            body = parse_chunks(chunks(), **kwargs)
+        except ExpatError:
+            raw = ''.join(head)
+            if len(raw) < MAX_ERROR_BODY:
+                rest = resp.read(MAX_ERROR_BODY - len(raw))
+                size[0] += len(rest)
+                raw += rest
+            if size[0] > len(raw) or resp.read(1):
+                resp.close()
+                raw += '...'
+            return raw, size[0]
+        try:
+            return body['%sResponse' % action], size[0]
+        except (KeyError, TypeError):
+            return body, size[0]
+
+    def decode_body(self, action, resp, body):
         try:
             if resp.headers['Content-Type'].startswith('application/json'):
-                body = json.loads(body)
+                # keep the field order of the server, like the XML path
+                body = _get_json().loads(
+                    body, object_pairs_hook=collections.OrderedDict)
+                if self.records:
+                    convert_records(body, self.record_types)
+            elif self.records:
+                body = parse(body, postprocessor=self._postprocessor)
             else:
                 body = parse(body)
-            action = self._get_action(2)
             return body['%sResponse' % action]
         except:
             return body
 
+    def request(self, **kwargs):
+        stack = self._local.actions
+        if stack:
+            action = stack[-1].name
+        else:
+            action = self._get_action(2)
+        ttl = self.get_cache_ttl(action)
+        if ttl:
+            key = self.cache.make_key(self.get_cache_scope(), action, kwargs)
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+        if self.single_flight is not None and self.is_readonly(action):
+            # Timestamp and Signature are added later, identical calls have
+            # identical kwargs; callers raising errors must not share a
+            # call with callers printing them
+            raise_errors = self.raise_errors or \
+                getattr(self._local, 'raise_errors', False)
+            flight_key = (action, raise_errors, repr(sorted(kwargs.items())))
+            result = self.single_flight.do(flight_key, self._fetch, action,
+                                           kwargs)
+        else:
+            result = self._fetch(action, kwargs)
+        if ttl and result is not None:
+            self.cache.set(key, result, ttl)
+        return result
+
+    def _fetch(self, action, kwargs):
+        resp = self._do_request(action, kwargs)
+        return self.parse_response(action, resp)
+
+    def coalesce_stats(self):
+        """ Read-only requests sent and requests that shared an identical
+        one already in flight, with coalesce=True
+
+        :returns: dict with executed and shared counts
+        """
+        if self.single_flight is None:
+            return {'executed': 0, 'shared': 0}
+        return self.single_flight.stats()
+
+    def get_cache_ttl(self, action):
+        """ Seconds the result of action may be cached, 0 if not cached """
+        if self.cache is None:
+            return 0
+        ttls = self.cache.ttls
+        if ttls is None:
+            ttls = self.cache_ttls
+        return ttls.get(action, 0)
+
+    def get_cache_scope(self):
+        return (self.url, self.region, self.access, self.format,
+                self.records)
+
+    def invalidate_cache(self, action=None):
+        """ Drop cached results of action, or all of them """
+        if self.cache is not None:
+            self.cache.invalidate(action)
+
+    def stream(self, action, item_key, meta=None, **kwargs):
+        """ Stream the items of a list action while the response arrives
+
+        The response is requested as XML and fed to expat chunk by chunk
+        straight from the socket, every <item_key> element is yielded as
+        soon as it has been parsed instead of building the whole document.
+
+        :param action: API action name, e.g. DescribeInstances
+        :param item_key: element name of the items, e.g. Instance
+        :param meta: optional dict filled with the scalar siblings of the
+                     items, i.e. Total, Limit and Offset
+        :param kwargs: raw API parameters, see parse_list_params
+        """
+        kwargs.setdefault('Format', 'xml')
+        resp = self._do_request(action, kwargs)
+        if not resp:
+            return
+        if self.debug:
+            print resp.headers
+        try:
+            if resp.headers['Content-Type'].startswith('application/json'):
+                body = self.parse_response(action, resp)
+                if meta is not None:
+                    meta['Total'] = self.get_list_total(body)
+                for item in self.get_list_items(body, item_key):
+                    yield item
+                return
+            record_type = None
+            if self.records:
+                record_type = self.record_types.get(item_key)
+            for path, item in iterparse(resp, item_depth=3):
+                name = path[-1][0]
+                if name == item_key:
+                    if record_type is not None and isinstance(item, dict):
+                        item = record_type.from_dict(item)
+                    yield item
+                elif meta is not None and not isinstance(item, dict):
+                    meta[name] = item
+        finally:
+            resp.close()
+
+    @contextlib.contextmanager
+    def errors_raised(self):
+        """ Raise HTTP errors instead of printing them, in this thread """
+        previous = getattr(self._local, 'raise_errors', False)
+        self._local.raise_errors = True
+        try:
+            yield
+        finally:
+            self._local.raise_errors = previous
+
+    def describe_error(self, e):
+        if isinstance(e, urllib2.HTTPError):
+            return self.get_httperror(e, False)
+        return '%s: %s' % (e.__class__.__name__, e)
+
+    def batch(self, method, keys, workers=10, **kwargs):
+        """ Call method(key, **kwargs) for every key concurrently
+
+        HTTP errors are raised inside the batch and recorded per key, so
+        one failing item does not stop the others.
+
+        :param method: bound action method, e.g. client.StartInstance
+        :param keys: first argument of every call, e.g. instance IDs
+        :param workers: max concurrent requests
+        :type workers: int
+        :returns: mosclient.common.batch.BatchSummary
+        """
+        def call(key):
+            with self.errors_raised():
+                return method(key, **kwargs)
+        return run_batch(call, keys, workers, self.describe_error)
+
     @classmethod
     def parse_list_params(self, limit, offset, filters, kwargs):
         if limit > 0:
@@ -152,3 +561,131 @@ class BaseClient(object):
                     kwargs['Filter.%d.Value.%d' % (fidx, vidx)] = v
                     vidx += 1
                 fidx += 1
+
+    @staticmethod
+    def get_list_items(page, item_key):
+        """ Return the items of a list response page as a list
+
+        A page holding a single item comes back from the XML parser as
+        the item itself and an empty page as None, both are normalized.
+        """
+        if not isinstance(page, dict):
+            return []
+        if item_key not in page and (item_key + 'Set') in page:
+            page = page[item_key + 'Set']
+            if not isinstance(page, dict):
+                return []
+        items = page.get(item_key)
+        if items is None:
+            return []
+        if not isinstance(items, list):
+            items = [items]
+        return items
+
+    @staticmethod
+    def get_list_total(page):
+        """ Return Total of a list response page, None if missing """
+        if not isinstance(page, dict):
+            return None
+        if 'Total' not in page:
+            for k, v in page.iteritems():
+                if k.endswith('Set') and isinstance(v, dict):
+                    page = v
+                    break
+        try:
+            return int(page['Total'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _get_callargs(method, args, kwargs):
+        import inspect
+        func = getattr(method, '__func__', method)
+        while hasattr(func, '__wrapped__'):
+            func = func.__wrapped__
+        callargs = inspect.getcallargs(func, method.__self__, *args, **kwargs)
+        argspec = inspect.getargspec(func)
+        callargs.pop(argspec.args[0])
+        if argspec.keywords:
+            callargs.update(callargs.pop(argspec.keywords))
+        return callargs
+
+    @staticmethod
+    def _fetch_page(method, callargs, limit, offset):
+        callargs = dict(callargs)
+        callargs['limit'] = limit
+        callargs['offset'] = offset
+        return method(**callargs)
+
+    def paginate(self, method, item_key, *args, **kwargs):
+        """ Iterate over every item of a paginated list action
+
+        Pages are fetched lazily, one request per page_size items, until
+        Total items have been returned, so only one page is held in memory.
+
+        With workers > 1 the first page is fetched to learn Total, then
+        the remaining offset windows are requested concurrently, at most
+        workers pages in flight, and items are still yielded in order.
+
+        :param method: bound list method, e.g. client.DescribeInstances
+        :param item_key: element name of the items, e.g. Instance
+        :param page_size: items per request, defaults to limit or 100
+        :type page_size: int
+        :param workers: max pages fetched concurrently, defaults to 1
+        :type workers: int
+        """
+        page_size = kwargs.pop('page_size', None)
+        workers = kwargs.pop('workers', 1)
+        callargs = self._get_callargs(method, args, kwargs)
+        if not page_size:
+            page_size = callargs.get('limit') or 100
+        offset = callargs.get('offset') or 0
+        while True:
+            page = self._fetch_page(method, callargs, page_size, offset)
+            items = self.get_list_items(page, item_key)
+            for item in items:
+                yield item
+            offset += len(items)
+            total = self.get_list_total(page)
+            if not items or (total is not None and offset >= total):
+                break
+            if total is None and len(items) < page_size:
+                break
+            if workers > 1 and total is not None:
+                # the server may cap the page size below the requested one
+                step = min(page_size, len(items))
+                for item in self._paginate_parallel(method, item_key,
+                                                    callargs, step, offset,
+                                                    total, workers):
+                    yield item
+                break
+
+    def _paginate_parallel(self, method, item_key, callargs, step, offset,
+                           total, workers):
+        executor = ThreadPoolExecutor(workers)
+        offsets = iter(xrange(offset, total, step))
+        pending = collections.deque()
+        # errors_raised() of the caller applies to the page workers too
+        raise_errors = getattr(self._local, 'raise_errors', False)
+
+        def fetch(off):
+            if not raise_errors:
+                return self._fetch_page(method, callargs, step, off)
+            with self.errors_raised():
+                return self._fetch_page(method, callargs, step, off)
+        try:
+            for off in itertools.islice(offsets, workers):
+                pending.append(executor.submit(fetch, off))
+            while pending:
+                page = pending.popleft().result()
+                for off in itertools.islice(offsets, 1):
+                    pending.append(executor.submit(fetch, off))
+                for item in self.get_list_items(page, item_key):
+                    yield item
+        except BaseException:
+            # closed early or a page failed, pages still in flight finish
+            # on their own and are joined at exit at the latest
+            executor.shutdown(wait=False)
+            raise
+        # every worker is idle once the last page has been read
+        executor.shutdown(wait=True)
@@ -0,0 +1,289 @@
+import base64
+import select
+import socket
+import httplib
+import urllib
+import urllib2
+import threading
+import time
+
+from urlparse import urlparse
+
+
+class PooledResponse(object):
+    """Wrap an httplib response and hand its connection back to the pool
+    once the body has been consumed.
+
+    Exposes the subset of the urllib2 response interface used by callers
+    of BaseClient.raw_request: read(), headers, info(), getcode(), geturl().
+    """
+
+    def __init__(self, pool, key, conn, resp, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+        self.url = url
+        self.code = resp.status
+        self.msg = resp.reason
+        self.headers = resp.msg
+
+    def read(self, amt=None):
+        try:
+            data = self._resp.read(amt)
+        except Exception:
+            self._release(False)
+            raise
+        if self._resp.isclosed():
+            self._release(not self._resp.will_close)
+        return data
+
+    def readline(self, limit=-1):
+        line = []
+        while limit < 0 or len(line) < limit:
+            c = self.read(1)
+            if not c:
+                break
+            line.append(c)
+            if c == '\n':
+                break
+        return ''.join(line)
+
+    def close(self):
+        if self._conn is not None:
+            # unread body left on the wire, connection cannot be reused
+            self._resp.close()
+            self._release(False)
+
+    def _release(self, reusable):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if reusable:
+            self._pool.put(self._key, conn)
+        else:
+            self._pool.discard(conn)
+
+    def info(self):
+        return self.headers
+
+    def getcode(self):
+        return self.code
+
+    def geturl(self):
+        return self.url
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP(S) connection pool.
+
+    Idle connections are kept per (scheme, host, port), at most maxsize of
+    them per host; connections idle for longer than idle_timeout seconds,
+    or already closed by the server, are closed instead of being reused.
+
+    Like urllib2, the http_proxy, https_proxy and no_proxy environment
+    variables are honored: http requests are sent to the proxy with an
+    absolute URI, https requests through a CONNECT tunnel. The proxy of
+    a host is looked up once.
+
+    :param maxsize: max idle connections kept per host
+    :type maxsize: int
+    :param idle_timeout: seconds before an idle connection is evicted
+    :type idle_timeout: int
+    """
+
+    def __init__(self, maxsize=10, idle_timeout=60):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._proxies = {}
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'evicted': 0,
+        }
+
+    def _incr(self, name, count=1):
+        with self._lock:
+            self.stats[name] += count
+
+    @staticmethod
+    def _get_key(url):
+        req = urlparse(url)
+        scheme = req.scheme or 'http'
+        port = req.port
+        if port is None:
+            port = 443 if scheme == 'https' else 80
+        return (scheme, req.hostname, port)
+
+    def get_proxy(self, key):
+        """Return (host, port, headers) of the proxy to reach key through,
+        None to connect directly."""
+        try:
+            return self._proxies[key]
+        except KeyError:
+            pass
+        scheme, host, port = key
+        proxy = urllib.getproxies().get(scheme)
+        if proxy and not urllib.proxy_bypass('%s:%d' % (host, port)):
+            if '://' not in proxy:
+                proxy = 'http://' + proxy
+            req = urlparse(proxy)
+            headers = {}
+            if req.username is not None:
+                auth = '%s:%s' % (urllib.unquote(req.username),
+                                  urllib.unquote(req.password or ''))
+                headers['Proxy-Authorization'] = \
+                    'Basic ' + base64.b64encode(auth)
+            proxy = (req.hostname, req.port or 80, headers)
+        else:
+            proxy = None
+        self._proxies[key] = proxy
+        return proxy
+
+    def _new_conn(self, key, timeout):
+        scheme, host, port = key
+        proxy = self.get_proxy(key)
+        if proxy is None:
+            if scheme == 'https':
+                conn = httplib.HTTPSConnection(host, port, timeout=timeout)
+            else:
+                conn = httplib.HTTPConnection(host, port, timeout=timeout)
+        elif scheme == 'https':
+            proxy_host, proxy_port, proxy_headers = proxy
+            conn = httplib.HTTPSConnection(proxy_host, proxy_port,
+                                           timeout=timeout)
+            conn.set_tunnel(host, port, proxy_headers)
+        else:
+            conn = httplib.HTTPConnection(proxy[0], proxy[1],
+                                          timeout=timeout)
+        self._incr('created')
+        return conn
+
+    @staticmethod
+    def is_dropped(conn):
+        """Whether an idle connection was closed by the other end, an idle
+        keep-alive socket only becomes readable at EOF."""
+        sock = conn.sock
+        if sock is None:
+            return False
+        try:
+            if hasattr(select, 'poll'):
+                poller = select.poll()
+                poller.register(sock, select.POLLIN)
+                return bool(poller.poll(0))
+            return bool(select.select([sock], [], [], 0)[0])
+        except (select.error, ValueError):
+            return True
+
+    def get(self, key, timeout):
+        """Return (conn, reused) for key, reusing an idle connection if any."""
+        now = time.time()
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                c, last_used = idle.pop()
+                if now - last_used > self.idle_timeout or self.is_dropped(c):
+                    expired.append(c)
+                else:
+                    conn = c
+                    break
+            self.stats['evicted'] += len(expired)
+            if conn is not None:
+                self.stats['reused'] += 1
+        for c in expired:
+            c.close()
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        return self._new_conn(key, timeout), False
+
+    def put(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append((conn, time.time()))
+                return
+            self.stats['discarded'] += 1
+        conn.close()
+
+    def discard(self, conn):
+        self._incr('discarded')
+        conn.close()
+
+    def evict_idle(self):
+        """Close all connections idle for longer than idle_timeout."""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = []
+                for c, last_used in idle:
+                    if now - last_used > self.idle_timeout:
+                        expired.append(c)
+                    else:
+                        keep.append((c, last_used))
+                self._idle[key] = keep
+            self.stats['evicted'] += len(expired)
+        for c in expired:
+            c.close()
+
+    def clear(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for c, _ in conns:
+                c.close()
+
+    def urlopen(self, url, data, headers, timeout, idempotent=False):
+        """POST data to url over a pooled connection.
+
+        Returns a PooledResponse, raises urllib2.HTTPError on status >= 400
+        just like urllib2.urlopen does.
+
+        If a reused connection fails while the request is written, it was
+        stale and the request is sent again on another one. A failure
+        while waiting for the response does not tell whether the server
+        ran the request, it is only sent again when idempotent.
+        """
+        key = self._get_key(url)
+        req = urlparse(url)
+        path = req.path or '/'
+        if req.query:
+            path = '%s?%s' % (path, req.query)
+        proxy = self.get_proxy(key)
+        if proxy is not None and key[0] == 'http':
+            # a proxy forwarding plain http wants the absolute URI
+            path = '%s://%s:%d%s' % (key + (path,))
+            headers = dict(headers, **proxy[2])
+        while True:
+            conn, reused = self.get(key, timeout)
+            try:
+                conn.request('POST', path, data, headers)
+            except (socket.error, httplib.HTTPException):
+                conn.close()
+                if reused:
+                    # server dropped the keep-alive connection, retry on a
+                    # fresh one
+                    continue
+                raise
+            try:
+                resp = conn.getresponse()
+            except (socket.error, httplib.HTTPException):
+                conn.close()
+                if reused and idempotent:
+                    continue
+                raise
+            break
+        resp = PooledResponse(self, key, conn, resp, url)
+        if resp.code >= 400:
+            raise urllib2.HTTPError(url, resp.code, resp.msg, resp.headers,
+                                    resp)
+        return resp
@@ -2,17 +2,22 @@ import logging
 import hashlib
 import hmac
 import base64
-import urllib
+
+from urllib import quote
 
 
 class Ec2Signer(object):
     """Hacked up code from boto/connection.py"""
 
     def __init__(self, secret_key):
+        # keyed once, every signature works on a copy() of these states
         secret_key = secret_key.encode()
         self.hmac = hmac.new(secret_key, digestmod=hashlib.sha1)
         if hashlib.sha256:
             self.hmac_256 = hmac.new(secret_key, digestmod=hashlib.sha256)
+        else:
+            self.hmac_256 = None
+        self._quoted_keys = {}
 
     def generate(self, credentials):
         """Generate auth string according to what SignatureVersion is given."""
@@ -41,42 +46,58 @@ class Ec2Signer(object):
     def _calc_signature_0(self, params):
         """Generate AWS signature version 0 string."""
         s = params['Action'] + params['Timestamp']
-        self.hmac.update(s)
-        return base64.b64encode(self.hmac.digest())
+        current_hmac = self.hmac.copy()
+        current_hmac.update(s)
+        return base64.b64encode(current_hmac.digest())
 
     def _calc_signature_1(self, params):
         """Generate AWS signature version 1 string."""
         keys = params.keys()
         keys.sort(cmp=lambda x, y: cmp(x.lower(), y.lower()))
+        current_hmac = self.hmac.copy()
         for key in keys:
-            self.hmac.update(key)
+            current_hmac.update(key)
             val = self._get_utf8_value(params[key])
-            self.hmac.update(val)
-        return base64.b64encode(self.hmac.digest())
+            current_hmac.update(val)
+        return base64.b64encode(current_hmac.digest())
+
+    def _quote_key(self, key):
+        # parameter names repeat on every request, quote each one once
+        try:
+            return self._quoted_keys[key]
+        except KeyError:
+            qkey = quote(key, safe='') + '='
+            if len(self._quoted_keys) < 1024:
+                self._quoted_keys[key] = qkey
+            return qkey
+
+    def canonical_query(self, params):
+        """Build the sorted, quoted query string that gets signed."""
+        quote_key = self._quote_key
+        get_utf8_value = self._get_utf8_value
+        return '&'.join([quote_key(key) +
+                         quote(get_utf8_value(params[key]), safe='-_~')
+                         for key in sorted(params)])
 
     def _calc_signature_2(self, params, verb, server_string, path):
         """Generate AWS signature version 2 string."""
-        logging.debug('using _calc_signature_2')
-        string_to_sign = '%s\n%s\n%s\n' % (verb, server_string, path)
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if debug:
+            logging.debug('using _calc_signature_2')
         if self.hmac_256:
-            current_hmac = self.hmac_256
+            current_hmac = self.hmac_256.copy()
             params['SignatureMethod'] = 'HmacSHA256'
         else:
-            current_hmac = self.hmac
+            current_hmac = self.hmac.copy()
             params['SignatureMethod'] = 'HmacSHA1'
-        keys = params.keys()
-        keys.sort()
-        pairs = []
-        for key in keys:
-            val = self._get_utf8_value(params[key])
-            val = urllib.quote(val, safe='-_~')
-            pairs.append(urllib.quote(key, safe='') + '=' + val)
-        qs = '&'.join(pairs)
-        logging.debug('query string: %s', qs)
-        string_to_sign += qs
-        logging.debug('string_to_sign: %s', string_to_sign)
+        qs = self.canonical_query(params)
+        string_to_sign = '%s\n%s\n%s\n%s' % (verb, server_string, path, qs)
+        if debug:
+            logging.debug('query string: %s', qs)
+            logging.debug('string_to_sign: %s', string_to_sign)
         current_hmac.update(string_to_sign)
         b64 = base64.b64encode(current_hmac.digest())
-        logging.debug('len(b64)=%d', len(b64))
-        logging.debug('base64 encoded digest: %s', b64)
+        if debug:
+            logging.debug('len(b64)=%d', len(b64))
+            logging.debug('base64 encoded digest: %s', b64)
         return b64
@@ -0,0 +1,185 @@
+import sys
+import atexit
+import threading
+import weakref
+import Queue
+
+
+# worker thread -> queue of its executor, workers still alive at exit are
+# stopped and joined before the interpreter tears down the modules they use
+_workers = weakref.WeakKeyDictionary()
+_workers_lock = threading.Lock()
+_exiting = False
+
+
+def _python_exit():
+    global _exiting
+    with _workers_lock:
+        _exiting = True
+        workers = list(_workers.items())
+    for t, queue in workers:
+        queue.put(None)
+    for t, queue in workers:
+        t.join()
+
+atexit.register(_python_exit)
+
+
+class Future(object):
+    """Result of a call submitted to an Executor."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def set_result(self, result):
+        with self._cond:
+            self._result = result
+            self._done = True
+            self._cond.notify_all()
+        self._run_callbacks()
+
+    def set_exception(self, exc_info):
+        """exc_info is a sys.exc_info() tuple, so result() can re-raise
+        with the original traceback."""
+        with self._cond:
+            self._exc_info = exc_info
+            self._done = True
+            self._cond.notify_all()
+        self._run_callbacks()
+
+    def _wait(self, timeout):
+        with self._cond:
+            if not self._done:
+                self._cond.wait(timeout)
+            if not self._done:
+                raise TimeoutError()
+
+    def result(self, timeout=None):
+        self._wait(timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _run_callbacks(self):
+        with self._cond:
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception:
+                pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class ThreadPoolExecutor(object):
+    """Run callables on a fixed number of daemon worker threads.
+
+    Workers are started lazily, up to max_workers, as work is submitted.
+    At interpreter exit, workers finish the work already submitted and
+    are joined, also after shutdown(wait=False).
+    """
+
+    def __init__(self, max_workers=10):
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._shutdown or _exiting:
+                raise RuntimeError('cannot submit after shutdown')
+            future = Future()
+            self._queue.put((future, fn, args, kwargs))
+            if len(self._threads) < self.max_workers:
+                t = threading.Thread(target=self._worker)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+                with _workers_lock:
+                    _workers[t] = self._queue
+        return future
+
+    def map(self, fn, *iterables):
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+        return [f.result() for f in futures]
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                future.set_exception(sys.exc_info())
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+
+def wait(futures, timeout=None):
+    """Wait until every future is done, returns (done, not_done) lists."""
+    event = threading.Event()
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def _one_done(f):
+        with lock:
+            pending[0] -= 1
+            if pending[0] == 0:
+                event.set()
+
+    for f in futures:
+        f.add_done_callback(_one_done)
+    if futures:
+        event.wait(timeout)
+    done = [f for f in futures if f.done()]
+    not_done = [f for f in futures if not f.done()]
+    return done, not_done
+
+
+def as_completed(futures, timeout=None):
+    """Yield futures as they complete."""
+    queue = Queue.Queue()
+    for f in futures:
+        f.add_done_callback(queue.put)
+    for _ in range(len(futures)):
+        try:
+            yield queue.get(True, timeout)
+        except Queue.Empty:
+            raise TimeoutError()
@@ -0,0 +1,43 @@
+import threading
+
+
+# before-sign:    action, params; params may still be changed
+# before-send:    action, data, headers, attempt; headers may be changed
+# after-response: action, status, elapsed, bytes_out, error, attempt;
+#                 status is None and error set for network errors
+# after-parse:    action, elapsed, bytes_in, result
+EVENTS = ('before-sign', 'before-send', 'after-response', 'after-parse')
+
+
+class Hooks(object):
+    """Handlers called at the stages of every API request.
+
+    Handlers are called with keyword arguments only: client plus the
+    arguments listed in EVENTS for the event. They should accept
+    **kwargs so that arguments added later do not break them. Exceptions
+    raised by a handler propagate to the caller of the request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = {}
+
+    def register(self, event, handler):
+        if event not in EVENTS:
+            raise ValueError('Unknown event: %s' % event)
+        with self._lock:
+            # copy on write, emit() iterates without taking the lock
+            handlers = list(self._handlers.get(event, ()))
+            handlers.append(handler)
+            self._handlers[event] = handlers
+
+    def unregister(self, event, handler):
+        with self._lock:
+            handlers = list(self._handlers.get(event, ()))
+            if handler in handlers:
+                handlers.remove(handler)
+            self._handlers[event] = handlers
+
+    def emit(self, event, **kwargs):
+        for handler in self._handlers.get(event, ()):
+            handler(**kwargs)
@@ -0,0 +1,154 @@
+import sys
+import time
+import threading
+
+from futures import Future, ThreadPoolExecutor
+
+
+class IdLoader(object):
+    """Batch lookups of single items into list calls taking ID lists.
+
+    load(id) returns a Future at once. IDs requested by any thread within
+    window seconds of the first pending one are sent together as one
+    list call, e.g. DescribeInstances(ids=[...]), in chunks of at most
+    max_batch IDs, and every Future gets the item with its ID, or None
+    if the list did not return it. Concurrent loads of the same ID share
+    one slot of the batch. A failed call fails the Futures of its chunk.
+
+    >>> loader = IdLoader(client.DescribeInstances)
+    >>> futures = [loader.load(iid) for iid in ids]
+    >>> instance = loader.get(iid)
+
+    :param method: bound list method declared with an ids_arg, see
+                   mosclient.v1.client.ID_LIST_ARGS
+    :param window: seconds to wait for more IDs before sending a batch
+    :param max_batch: max IDs per call, a full batch is sent at once
+    :param workers: max list calls in flight
+    :param id_key: field holding the item ID, found from the response
+                   when None
+    """
+
+    def __init__(self, method, window=0.005, max_batch=100, workers=4,
+                 id_key=None):
+        spec = getattr(method, 'action', None)
+        if spec is None or spec.ids_arg is None:
+            raise ValueError('%s does not take a list of IDs' %
+                             getattr(method, '__name__', method))
+        self.client = method.__self__
+        self.method = method
+        self.item_key = spec.item_key
+        self.ids_arg = spec.ids_arg
+        self.window = window
+        self.max_batch = max_batch
+        self.id_key = id_key
+        self.calls = 0
+        self._executor = ThreadPoolExecutor(workers)
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._deadline = None
+        self._closed = False
+        self._thread = None
+
+    def load(self, rid):
+        """ Future of the item with ID rid, None if it does not exist """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('cannot load after close')
+            futures = self._pending.get(rid)
+            if futures is None:
+                futures = self._pending[rid] = []
+                # wake the dispatcher for the first ID and a full batch
+                if len(self._pending) >= self.max_batch:
+                    self._deadline = 0
+                    self._cond.notify()
+                elif self._deadline is None:
+                    self._deadline = time.time() + self.window
+                    self._cond.notify()
+            future = Future()
+            futures.append(future)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch)
+                self._thread.daemon = True
+                self._thread.start()
+        return future
+
+    def load_many(self, ids):
+        return [self.load(rid) for rid in ids]
+
+    def get(self, rid, timeout=None):
+        """ The item with ID rid, waiting for its batch """
+        return self.load(rid).result(timeout)
+
+    def get_many(self, ids, timeout=None):
+        return [f.result(timeout) for f in self.load_many(ids)]
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                delay = self._deadline - time.time()
+                if delay > 0 and not self._closed:
+                    self._cond.wait(delay)
+                    continue
+                pending, self._pending = self._pending, {}
+                self._deadline = None
+            ids = pending.keys()
+            for i in range(0, len(ids), self.max_batch):
+                chunk = dict((rid, pending[rid])
+                             for rid in ids[i:i + self.max_batch])
+                self._executor.submit(self._load_chunk, chunk)
+
+    def _load_chunk(self, chunk):
+        ids = list(chunk)
+        try:
+            with self.client.errors_raised():
+                val = self.method(limit=len(ids), **{self.ids_arg: ids})
+            with self._cond:
+                self.calls += 1
+            items = self.client.get_list_items(val, self.item_key)
+            found = {}
+            for item in items:
+                rid = self.get_id(item, chunk)
+                if rid is not None:
+                    found[rid] = item
+        except BaseException:
+            exc_info = sys.exc_info()
+            for futures in chunk.itervalues():
+                for future in futures:
+                    future.set_exception(exc_info)
+            return
+        for rid, futures in chunk.iteritems():
+            for future in futures:
+                future.set_result(found.get(rid))
+
+    def get_id(self, item, requested):
+        if self.id_key is None:
+            guess = (self.item_key + 'Id').lower()
+            keys = item.keys()
+            for key in keys:
+                if key.lower() == guess:
+                    self.id_key = key
+                    break
+            else:
+                # the field whose value is one of the requested IDs
+                for key in keys:
+                    value = item[key]
+                    if isinstance(value, basestring) and value in requested:
+                        self.id_key = key
+                        break
+                else:
+                    return None
+        return item.get(self.id_key)
+
+    def close(self):
+        """ Send the pending batch and stop once it has been loaded """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,185 @@
+import bisect
+import threading
+
+
+# seconds, upper bounds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0, 30.0)
+
+
+class Histogram(object):
+    """Counts of observed values per bucket, plus their count and sum."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # the last slot counts values above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, values <= bound) pairs, ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'),),
+                                self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': [(bound, total) for bound, total in self.cumulative()],
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+        }
+
+
+class ActionMetrics(object):
+
+    def __init__(self, buckets):
+        self.requests = {}
+        self.errors = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.latency = Histogram(buckets)
+        self.parse_time = Histogram(buckets)
+
+    def to_dict(self):
+        return {
+            'requests': dict(self.requests),
+            'errors': self.errors,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'latency': self.latency.to_dict(),
+            'parse_time': self.parse_time.to_dict(),
+        }
+
+
+class MetricsCollector(object):
+    """Per action latency and parse time histograms, status counts, error
+    counts and bytes sent and received, fed by client hooks.
+
+    Latency is the time from sending a request until its response headers
+    arrive, one observation per attempt; parse time covers reading and
+    decoding the body.
+
+    >>> metrics = MetricsCollector()
+    >>> metrics.attach(client)
+    >>> print metrics.to_prometheus()
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._actions = {}
+
+    def attach(self, client):
+        client.hooks.register('after-response', self.on_response)
+        client.hooks.register('after-parse', self.on_parse)
+
+    def detach(self, client):
+        client.hooks.unregister('after-response', self.on_response)
+        client.hooks.unregister('after-parse', self.on_parse)
+
+    def _get(self, action):
+        metrics = self._actions.get(action)
+        if metrics is None:
+            metrics = self._actions[action] = ActionMetrics(self.buckets)
+        return metrics
+
+    def on_response(self, action, status, elapsed, bytes_out, error=None,
+                    **kwargs):
+        with self._lock:
+            metrics = self._get(action)
+            key = str(status) if status is not None else 'error'
+            metrics.requests[key] = metrics.requests.get(key, 0) + 1
+            if error is not None or status >= 400:
+                metrics.errors += 1
+            metrics.bytes_out += bytes_out
+            metrics.latency.observe(elapsed)
+
+    def on_parse(self, action, elapsed, bytes_in, **kwargs):
+        with self._lock:
+            metrics = self._get(action)
+            if bytes_in:
+                metrics.bytes_in += bytes_in
+            metrics.parse_time.observe(elapsed)
+
+    def reset(self):
+        with self._lock:
+            self._actions.clear()
+
+    def to_dict(self):
+        """ action -> requests per status, errors, bytes_out, bytes_in,
+        latency and parse_time histograms """
+        with self._lock:
+            return dict((action, metrics.to_dict())
+                        for action, metrics in self._actions.items())
+
+    def to_prometheus(self, prefix='mosclient'):
+        """ The metrics in the Prometheus text exposition format """
+        with self._lock:
+            actions = sorted(self._actions.items())
+            lines = []
+
+            def histogram(name, help, attr):
+                lines.append('# HELP %s_%s %s' % (prefix, name, help))
+                lines.append('# TYPE %s_%s histogram' % (prefix, name))
+                for action, metrics in actions:
+                    hist = getattr(metrics, attr)
+                    for bound, total in hist.cumulative():
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append('%s_%s_bucket{action="%s",le="%s"} %d' %
+                                     (prefix, name, action, le, total))
+                    lines.append('%s_%s_sum{action="%s"} %r' %
+                                 (prefix, name, action, hist.sum))
+                    lines.append('%s_%s_count{action="%s"} %d' %
+                                 (prefix, name, action, hist.count))
+
+            def counter(name, help, attr):
+                lines.append('# HELP %s_%s %s' % (prefix, name, help))
+                lines.append('# TYPE %s_%s counter' % (prefix, name))
+                for action, metrics in actions:
+                    lines.append('%s_%s{action="%s"} %d' %
+                                 (prefix, name, action,
+                                  getattr(metrics, attr)))
+
+            lines.append('# HELP %s_requests_total Requests sent, per '
+                         'action and HTTP status' % prefix)
+            lines.append('# TYPE %s_requests_total counter' % prefix)
+            for action, metrics in actions:
+                for status, count in sorted(metrics.requests.items()):
+                    lines.append('%s_requests_total{action="%s",'
+                                 'status="%s"} %d' %
+                                 (prefix, action, status, count))
+            counter('errors_total',
+                    'Requests failed with an HTTP or network error',
+                    'errors')
+            counter('request_bytes_total', 'Bytes of request bodies sent',
+                    'bytes_out')
+            counter('response_bytes_total', 'Bytes of response bodies read',
+                    'bytes_in')
+            histogram('request_duration_seconds',
+                      'Seconds until the response headers arrived',
+                      'latency')
+            histogram('parse_duration_seconds',
+                      'Seconds spent reading and decoding response bodies',
+                      'parse_time')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,143 @@
+import os
+import time
+import json
+import threading
+
+
+def _reserve(state, now, rate, burst, tokens):
+    """Take tokens from a bucket state [level, timestamp], return the
+    seconds the caller has to wait for them.
+
+    The level may go negative: later callers then queue up behind the
+    reserved tokens instead of all waking up at the same time.
+    """
+    level, last = state
+    level = min(burst, level + (now - last) * rate) - tokens
+    state[0] = level
+    state[1] = now
+    if level >= 0:
+        return 0
+    return -level / rate
+
+
+class MemoryBackend(object):
+    """Token bucket state shared by the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def reserve(self, buckets, tokens=1):
+        """buckets is a list of (name, rate, burst), returns the longest
+        wait in seconds."""
+        now = time.time()
+        wait = 0
+        with self._lock:
+            for name, rate, burst in buckets:
+                state = self._states.setdefault(name, [burst, now])
+                wait = max(wait, _reserve(state, now, rate, burst, tokens))
+        return wait
+
+
+class FileBackend(object):
+    """Token bucket state kept in a local file, shared by every process
+    (and thread) using the same path. Relies on fcntl.flock."""
+
+    def __init__(self, path):
+        import fcntl
+        self._fcntl = fcntl
+        self.path = os.path.expanduser(path)
+        self._lock = threading.Lock()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def _load(self):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        try:
+            return json.loads(''.join(chunks))
+        except ValueError:
+            return {}
+
+    def _store(self, states):
+        data = json.dumps(states)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.ftruncate(self._fd, 0)
+        os.write(self._fd, data)
+
+    def reserve(self, buckets, tokens=1):
+        wait = 0
+        with self._lock:
+            self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+            try:
+                states = self._load()
+                now = time.time()
+                for name, rate, burst in buckets:
+                    state = states.setdefault(name, [burst, now])
+                    wait = max(wait,
+                               _reserve(state, now, rate, burst, tokens))
+                self._store(states)
+            finally:
+                self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+        return wait
+
+    def close(self):
+        os.close(self._fd)
+
+
+class RateLimiter(object):
+    """Client side token bucket rate limiter.
+
+    A request for an action takes one token from the global bucket and
+    one from the bucket of that action, if configured, and sleeps until
+    both are available.
+
+    :param rate: global requests per second, None for no global limit
+    :type rate: float
+    :param burst: global bucket size, defaults to max(1, rate)
+    :type burst: float
+    :param per_action: action name -> rate or (rate, burst)
+    :type per_action: dict
+    :param backend: MemoryBackend (default, threads of this process) or
+                    FileBackend (every process using the same file)
+    """
+
+    def __init__(self, rate=None, burst=None, per_action=None,
+                 backend=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate or 0)
+        self.per_action = {}
+        for action, limit in (per_action or {}).items():
+            if isinstance(limit, (tuple, list)):
+                self.per_action[action] = tuple(limit)
+            else:
+                self.per_action[action] = (limit, max(1, limit))
+        if backend is None:
+            backend = MemoryBackend()
+        self.backend = backend
+
+    def get_buckets(self, action):
+        buckets = []
+        if self.rate:
+            buckets.append(('*', self.rate, self.burst))
+        if action in self.per_action:
+            rate, burst = self.per_action[action]
+            buckets.append((action, rate, burst))
+        return buckets
+
+    def acquire(self, action):
+        """Block until a request for action may be sent.
+
+        :returns: seconds spent waiting
+        """
+        buckets = self.get_buckets(action)
+        if not buckets:
+            return 0
+        wait = self.backend.reserve(buckets)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,169 @@
+"""
+Compact result objects for API resource items.
+
+A Record stores its field values in a tuple and shares the field names,
+together with a lower-cased name index, with every other record of the
+same type and field set, so large result sets cost one small object per
+item instead of an OrderedDict each, and case-insensitive lookups are a
+dict lookup instead of a scan over the keys.
+"""
+
+from collections import OrderedDict
+
+
+class _Schema(object):
+    __slots__ = ('keys', 'index', 'lower')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = dict((k, i) for i, k in enumerate(keys))
+        self.lower = dict((k.lower(), i) for i, k in enumerate(keys))
+
+
+_schemas = {}
+
+
+def _get_schema(keys):
+    schema = _schemas.get(keys)
+    if schema is None:
+        schema = _schemas.setdefault(keys, _Schema(keys))
+    return schema
+
+
+class Record(object):
+    """Read-mostly mapping of one resource item.
+
+    Supports the dict methods used on results (``[]``, get, keys, items,
+    ``in``), case-insensitive get_ignorecase and attribute access.
+    """
+
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, items=()):
+        if isinstance(items, dict):
+            items = items.items()
+        keys = []
+        values = []
+        for k, v in items:
+            keys.append(k)
+            values.append(v)
+        self._schema = _get_schema(tuple(keys))
+        self._values = tuple(values)
+
+    @classmethod
+    def from_dict(cls, d):
+        rec = cls.__new__(cls)
+        rec._schema = _get_schema(tuple(d.keys()))
+        rec._values = tuple(d.values())
+        return rec
+
+    def __reduce__(self):
+        return (self.__class__, (self.items(),))
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._schema.index[key]]
+        except KeyError:
+            pass
+        try:
+            return self._values[self._schema.lower[key.lower()]]
+        except (KeyError, AttributeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        idx = self._schema.index.get(key)
+        if idx is None:
+            self._schema = _get_schema(self._schema.keys + (key,))
+            self._values = self._values + (value,)
+        else:
+            values = list(self._values)
+            values[idx] = value
+            self._values = tuple(values)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def get_ignorecase(self, key, default=None):
+        idx = self._schema.lower.get(key.lower())
+        if idx is None:
+            return default
+        return self._values[idx]
+
+    def __contains__(self, key):
+        return key in self._schema.index or \
+            key.lower() in self._schema.lower
+
+    def __iter__(self):
+        return iter(self._schema.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return isinstance(other, dict) and dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def keys(self):
+        return list(self._schema.keys)
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return zip(self._schema.keys, self._values)
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def to_dict(self):
+        return OrderedDict(self.items())
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__,
+                           ', '.join('%s=%r' % kv for kv in self.items()))
+
+
+def make_postprocessor(record_types):
+    """xmltodict postprocessor turning elements named after a key of
+    record_types into instances of the mapped Record class."""
+    def postprocessor(path, key, value):
+        cls = record_types.get(key)
+        if cls is not None and isinstance(value, dict):
+            value = cls.from_dict(value)
+        return key, value
+    return postprocessor
+
+
+def convert(body, record_types):
+    """Replace, in place, items of a decoded JSON body by records."""
+    if isinstance(body, dict):
+        for key, value in body.iteritems():
+            cls = record_types.get(key)
+            if cls is not None:
+                if isinstance(value, dict):
+                    body[key] = cls.from_dict(value)
+                    continue
+                if isinstance(value, list):
+                    body[key] = [cls.from_dict(v) if isinstance(v, dict)
+                                 else v for v in value]
+                    continue
+            convert(value, record_types)
+    elif isinstance(body, list):
+        for value in body:
+            convert(value, record_types)
+    return body
@@ -0,0 +1,99 @@
+import time
+import random
+
+
+class RetryPolicy(object):
+    """When and how long to wait before retrying a failed request.
+
+    Delays grow exponentially from backoff, capped at max_backoff, and
+    with jitter enabled a random delay between 0 and that value is used
+    (full jitter) so concurrent clients do not retry in lockstep. A
+    Retry-After header sent with a retryable status is honored, up to
+    max_retry_after seconds.
+
+    A gateway error such as 502 or 504 does not tell whether the backend
+    ran the request, so actions that change state are only retried on
+    write_statuses, which mean the request was refused: 429, and 503 when
+    sent with a Retry-After header.
+
+    :param max_attempts: total attempts per request, 1 disables retries
+    :type max_attempts: int
+    :param backoff: delay of the first retry in seconds
+    :type backoff: float
+    :param max_backoff: upper bound of the computed delay in seconds
+    :type max_backoff: float
+    :param jitter: randomize delays
+    :type jitter: bool
+    :param statuses: HTTP status codes worth retrying
+    :type statuses: tuple
+    :param write_statuses: HTTP status codes worth retrying for actions
+                           that are not read-only, 503 only with a
+                           Retry-After header
+    :type write_statuses: tuple
+    :param network_errors: also retry connection errors and timeouts of
+                           read-only actions
+    :type network_errors: bool
+    :param max_retry_after: largest Retry-After value honored, in seconds
+    :type max_retry_after: float
+    """
+
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=20,
+                 jitter=True, statuses=(429, 502, 503, 504),
+                 write_statuses=(429, 503), network_errors=True,
+                 max_retry_after=60):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = statuses
+        self.write_statuses = write_statuses
+        self.network_errors = network_errors
+        self.max_retry_after = max_retry_after
+
+    def get_backoff(self, attempt):
+        delay = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Seconds to wait from a Retry-After header, None if invalid."""
+        if not value:
+            return None
+        try:
+            return max(0, int(value))
+        except ValueError:
+            pass
+        from email.utils import parsedate_tz, mktime_tz
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0, mktime_tz(date) - time.time())
+
+    def get_status_delay(self, attempt, status, headers=None,
+                         readonly=True):
+        """Delay before retrying after an HTTP error, None to give up."""
+        if attempt >= self.max_attempts:
+            return None
+        if readonly:
+            if status not in self.statuses:
+                return None
+        elif status not in self.write_statuses:
+            return None
+        retry_after = None
+        if headers is not None:
+            retry_after = self.parse_retry_after(headers.get('Retry-After'))
+        if not readonly and status == 503 and retry_after is None:
+            return None
+        delay = self.get_backoff(attempt)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+    def get_error_delay(self, attempt, readonly):
+        """Delay before retrying after a network error, None to give up."""
+        if attempt >= self.max_attempts or not self.network_errors or \
+                not readonly:
+            return None
+        return self.get_backoff(attempt)
@@ -0,0 +1,76 @@
+import sys
+import threading
+import cPickle as pickle
+
+
+class _Call(object):
+    __slots__ = ('event', 'result', 'data', 'exc_info', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.data = None
+        self.exc_info = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """Share one execution of a function among concurrent callers.
+
+    While do(key, fn) runs, other threads calling do() with the same key
+    wait for it and get its result, or its exception, instead of calling
+    fn again. Results are handed to waiters as unpickled copies, so no
+    caller sees another caller's changes to them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+        if not leader:
+            call.event.wait()
+            if call.exc_info is not None:
+                raise call.exc_info[0], call.exc_info[1], call.exc_info[2]
+            if call.data is not None:
+                return pickle.loads(call.data)
+            return call.result
+
+        try:
+            result = fn(*args)
+        except:
+            call.exc_info = sys.exc_info()
+            self._finish(key, call)
+            raise
+        with self._lock:
+            del self._calls[key]
+            waiters = call.waiters
+        if waiters:
+            try:
+                call.data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError):
+                call.result = result
+        call.event.set()
+        return result
+
+    def _finish(self, key, call):
+        with self._lock:
+            del self._calls[key]
+        call.event.set()
+
+    def stats(self):
+        """ Calls executed and calls that shared a running one """
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared}
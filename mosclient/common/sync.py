@@ -0,0 +1,234 @@
+import os
+import time
+import hashlib
+import cPickle as pickle
+
+from client import _get_json
+
+
+ADDED = 'added'
+MODIFIED = 'modified'
+REMOVED = 'removed'
+
+
+class Change(object):
+    """An item added, modified or removed since the previous listing.
+
+    :ivar type: ADDED, MODIFIED or REMOVED
+    :ivar id: ID of the item
+    :ivar item: the item as listed now, None when removed
+    :ivar old: the item of the previous listing, only with keep_items
+    """
+    __slots__ = ('type', 'id', 'item', 'old')
+
+    def __init__(self, type, id, item=None, old=None):
+        self.type = type
+        self.id = id
+        self.item = item
+        self.old = old
+
+    def __repr__(self):
+        return '<Change %s %s>' % (self.type, self.id)
+
+
+class SyncStats(object):
+
+    def __init__(self):
+        self.items = 0
+        self.added = 0
+        self.modified = 0
+        self.removed = 0
+        self.unchanged = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return 'Items: %d Added: %d Modified: %d Removed: %d ' \
+            'Unchanged: %d in %.2fs' % (self.items, self.added,
+                                        self.modified, self.removed,
+                                        self.unchanged, self.seconds)
+
+
+def _to_dict(obj):
+    to_dict = getattr(obj, 'to_dict', None)
+    if to_dict is not None:
+        return to_dict()
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+class Syncer(object):
+    """Incremental change detection over a paginated list action.
+
+    Only a digest of every item is kept between listings. sync() lists
+    the action again, fetching pages in parallel, and yields a Change for
+    every item added or modified as soon as its page arrives, then one
+    for every item that disappeared. Unchanged items are not yielded.
+
+    The snapshot is replaced only once a listing has been read to the
+    end, so an error or an abandoned iteration makes the next sync()
+    compare against the same previous listing again.
+
+    Pages are fetched by offset, so an item deleted while listing shifts
+    the later pages and another item can be missed. Before reporting
+    items as removed they are looked up by ID, through the ids_arg of
+    the action; with an action taking no ID list, an item skipped this
+    way is reported as removed and added again by the next sync().
+
+    Server side filters shrink both the listing and the stream: with
+    filters={'status': 'running'}, an instance that stops is reported as
+    removed. Hashing only some fields skips changes of the others:
+
+    >>> syncer = Syncer(client.DescribeInstances, fields=['status'])
+    >>> for change in syncer.sync():
+    ...     print change.type, change.id
+
+    :param method: bound list method, e.g. client.DescribeInstances
+    :param id_key: field holding the item ID, by default the item key
+                   with an Id suffix (instanceId), or id
+    :param fields: fields to compare, by default the whole item
+    :param keep_items: keep the previous items, to fill Change.old
+    :param page_size: items per request
+    :param workers: max pages fetched concurrently
+    :param kwargs: other arguments of method, e.g. filters or zone
+    """
+
+    def __init__(self, method, id_key=None, fields=None, keep_items=False,
+                 page_size=100, workers=4, **kwargs):
+        spec = getattr(method, 'action', None)
+        if spec is None or spec.item_key is None:
+            raise ValueError('%s is not a list action' %
+                             getattr(method, '__name__', method))
+        self.client = method.__self__
+        self.method = method
+        self.item_key = spec.item_key
+        self.ids_arg = spec.ids_arg
+        self.id_key = id_key
+        self.fields = fields
+        self.page_size = page_size
+        self.workers = workers
+        self.kwargs = kwargs
+        self.digests = {}
+        self.items = {} if keep_items else None
+        self.stats = None
+
+    def get_id(self, item):
+        if self.id_key is None:
+            guess = self.item_key[:1].lower() + self.item_key[1:] + 'Id'
+            for key in item.keys():
+                if key.lower() in (guess.lower(), 'id'):
+                    self.id_key = key
+                    break
+            else:
+                return None
+        return item.get(self.id_key)
+
+    def digest(self, item):
+        if self.fields is not None:
+            item = dict((k, item.get(k)) for k in self.fields)
+        data = _get_json().dumps(item, sort_keys=True, default=_to_dict)
+        return hashlib.sha1(data).digest()
+
+    def lookup(self, ids):
+        """ The items of ids that still exist, by ID, looked up through
+        the ids_arg of the action """
+        found = {}
+        for i in range(0, len(ids), self.page_size):
+            chunk = ids[i:i + self.page_size]
+            wanted = set(chunk)
+            kwargs = dict(self.kwargs)
+            kwargs[self.ids_arg] = chunk
+            with self.client.errors_raised():
+                val = self.method(limit=len(chunk), **kwargs)
+            for item in self.client.get_list_items(val, self.item_key):
+                rid = self.get_id(item)
+                if rid in wanted:
+                    found[rid] = item
+        return found
+
+    def _compare(self, rid, item, digests, items, stats):
+        stats.items += 1
+        digest = digests[rid] = self.digest(item)
+        if items is not None:
+            items[rid] = item
+        previous = self.digests.get(rid)
+        if previous == digest:
+            stats.unchanged += 1
+            return None
+        old = self.items.get(rid) if self.items is not None else None
+        if previous is None:
+            stats.added += 1
+            return Change(ADDED, rid, item)
+        stats.modified += 1
+        return Change(MODIFIED, rid, item, old)
+
+    def sync(self):
+        """ Yield the changes since the previous complete listing, the
+        first sync() reports every item as added """
+        start = time.time()
+        stats = SyncStats()
+        digests = {}
+        items = {} if self.items is not None else None
+        pages = self.client.paginate(self.method, self.item_key,
+                                     page_size=self.page_size,
+                                     workers=self.workers, **self.kwargs)
+        while True:
+            # raise instead of printing, a failed page must not look like
+            # removed items; the generator yields outside of the block
+            with self.client.errors_raised():
+                try:
+                    item = next(pages)
+                except StopIteration:
+                    break
+            rid = self.get_id(item)
+            # offset pages shift when items are created while listing
+            if rid is None or rid in digests:
+                continue
+            change = self._compare(rid, item, digests, items, stats)
+            if change is not None:
+                yield change
+        missing = [rid for rid in self.digests if rid not in digests]
+        found = {}
+        if missing and self.ids_arg is not None:
+            # pages shift back when items are deleted while listing
+            found = self.lookup(missing)
+        for rid in missing:
+            item = found.get(rid)
+            if item is not None:
+                change = self._compare(rid, item, digests, items, stats)
+                if change is not None:
+                    yield change
+                continue
+            stats.removed += 1
+            old = self.items.get(rid) if self.items is not None else None
+            yield Change(REMOVED, rid, None, old)
+        self.digests = digests
+        self.items = items
+        stats.seconds = time.time() - start
+        self.stats = stats
+
+    def save(self, path):
+        """ Write the snapshot to path, atomically """
+        import tempfile
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((self.fields, self.digests, self.items), f,
+                            pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, path)
+        except:
+            os.unlink(tmp)
+            raise
+
+    def load(self, path):
+        """ Restore a snapshot written by save(), returns False if path
+        does not exist or the snapshot compared other fields """
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb') as f:
+            fields, digests, items = pickle.load(f)
+        if fields != self.fields:
+            return False
+        self.digests = digests
+        if self.items is not None:
+            self.items = items or {}
+        return True
@@ -0,0 +1,57 @@
+import urllib2
+
+from connpool import ConnectionPool
+
+
+class Transport(object):
+    """Send an encoded, signed API request and return the raw response.
+
+    Implementations raise urllib2.HTTPError for error status codes, the
+    returned response provides read() and a headers mapping. A request
+    sent with idempotent=False must not be sent again once it may have
+    reached the server.
+    """
+
+    def send(self, url, data, headers, timeout, idempotent=False):
+        raise NotImplementedError()
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class UrllibTransport(Transport):
+    """One urllib2.urlopen call, i.e. one new connection, per request."""
+
+    def send(self, url, data, headers, timeout, idempotent=False):
+        req = urllib2.Request(url, data, headers)
+        return urllib2.urlopen(req, None, timeout)
+
+
+class PooledTransport(Transport):
+    """Send requests over keep-alive connections of a ConnectionPool.
+
+    :param pool: pool to use, a new one is created if None, pass the same
+                 pool to several transports to share connections
+    :type pool: ConnectionPool
+    """
+
+    def __init__(self, pool=None, pool_size=10, idle_timeout=60):
+        if pool is None:
+            pool = ConnectionPool(maxsize=pool_size,
+                                  idle_timeout=idle_timeout)
+        self.pool = pool
+
+    def send(self, url, data, headers, timeout, idempotent=False):
+        headers = dict(headers)
+        headers.setdefault('Content-Type',
+                           'application/x-www-form-urlencoded')
+        return self.pool.urlopen(url, data, headers, timeout, idempotent)
+
+    def stats(self):
+        return dict(self.pool.stats)
+
+    def close(self):
+        self.pool.clear()
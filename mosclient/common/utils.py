@@ -1,7 +1,6 @@
 import sys
 import os
-import prettytable
-import urllib
+import collections
 from functools import wraps
 
 
@@ -16,6 +15,9 @@ def arg(*args, **kwargs):
 
 
 def get_value_ignorecase(dictobj, key):
+    get_ignorecase = getattr(dictobj, 'get_ignorecase', None)
+    if get_ignorecase is not None:
+        return get_ignorecase(key)
     for k in dictobj.keys():
         if k.lower() == key.lower():
             return dictobj[k]
@@ -29,7 +31,155 @@ def get_attribute_ignorecase(obj, key):
     return None
 
 
+# output formats of print_list and print_dict, set by climos --output
+OUTPUT_FORMATS = ('table', 'json', 'jsonl', 'csv', 'tsv')
+
+_output_format = 'table'
+
+# columns of print_list, set by climos --fields
+_output_fields = None
+
+
+def set_output_format(fmt):
+    global _output_format
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError('Unknown output format: %s' % fmt)
+    _output_format = fmt
+
+
+def set_output_fields(fields):
+    """Columns of every list printed, None for those of the command"""
+    global _output_fields
+    _output_fields = fields or None
+
+
+def get_output_format():
+    return _output_format
+
+
+def _get_field(o, field, formatters):
+    if field in formatters:
+        return formatters[field](o)
+    field_name = field.lower().replace(' ', '_')
+    if isinstance(o, dict) or hasattr(o, 'get_ignorecase'):
+        return get_value_ignorecase(o, field_name)
+    return get_attribute_ignorecase(o, field_name)
+
+
+def _json_default(o):
+    if hasattr(o, 'to_dict'):
+        return o.to_dict()
+    return '%s' % o
+
+
+def _to_cell(value):
+    import json
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)) or hasattr(value, 'to_dict'):
+        value = json.dumps(value, default=_json_default)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return '%s' % value
+
+
+class _TSVWriter(object):
+    """ One line per row, backslash escapes keep tabs and newlines inside
+    values from breaking lines and columns """
+
+    ESCAPES = (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r'))
+
+    def __init__(self, out):
+        self.out = out
+
+    def writerow(self, row):
+        cells = []
+        for cell in row:
+            for char, escape in self.ESCAPES:
+                cell = cell.replace(char, escape)
+            cells.append(cell)
+        self.out.write('\t'.join(cells) + '\n')
+
+
+def _get_writer(fmt):
+    if fmt == 'tsv':
+        return _TSVWriter(sys.stdout)
+    import csv
+    return csv.writer(sys.stdout, lineterminator='\n')
+
+
+def write_list(objs, fields=None, formatters={}):
+    """Write objs in the current machine readable output format
+
+    Rows are written and flushed one by one as objs yields them, nothing
+    is buffered, so a generator over the pages of a list action streams
+    to a pipe while later pages are still being fetched. Without fields,
+    csv and tsv columns are the sorted keys of the first object; keys
+    only later objects have cannot be added to the header, they are
+    reported on stderr once the list ends.
+    """
+    import json
+    out = sys.stdout
+    fmt = _output_format
+    if fmt in ('json', 'jsonl'):
+        if fmt == 'json':
+            out.write('[')
+        sep = '\n'
+        for o in objs:
+            if fields:
+                o = collections.OrderedDict(
+                    (f, _get_field(o, f, formatters)) for f in fields)
+            line = json.dumps(o, default=_json_default)
+            if fmt == 'json':
+                out.write(sep)
+                sep = ',\n'
+            out.write(line)
+            if fmt == 'jsonl':
+                out.write('\n')
+            out.flush()
+        if fmt == 'json':
+            out.write('\n]\n')
+        return
+    writer = _get_writer(fmt)
+    columns = None
+    omitted = []
+    if fields:
+        writer.writerow([_to_cell(f) for f in fields])
+    for o in objs:
+        if hasattr(o, 'to_dict'):
+            o = o.to_dict()
+        if not fields:
+            fields = sorted(k.upper() for k in o.keys())
+            columns = set(fields)
+            writer.writerow([_to_cell(f) for f in fields])
+        elif columns is not None:
+            for k in o.keys():
+                if k.upper() not in columns:
+                    columns.add(k.upper())
+                    omitted.append(k)
+        writer.writerow([_to_cell(_get_field(o, f, formatters))
+                         for f in fields])
+        out.flush()
+    if omitted:
+        sys.stderr.write('Fields not in the first row were left out: %s, '
+                         'choose the columns with --fields\n' %
+                         ', '.join(omitted))
+
+
 def print_list(data, field, fields=None, formatters={}):
+    if _output_fields:
+        fields = _output_fields
+    if _output_format != 'table':
+        if isinstance(data, dict):
+            data = data.get(field, [])
+            if not isinstance(data, list):
+                data = [data]
+        elif data is None:
+            data = []
+        return write_list(data, fields, formatters)
+    if hasattr(data, 'next'):
+        # a generator over the pages of a list action
+        data = list(data)
     if isinstance(data, list):
         objs = data
         if len(objs) > 1:
@@ -62,6 +212,7 @@ def print_list(data, field, fields=None, formatters={}):
                 k = k.upper()
                 if k not in fields:
                     fields.append(k)
+    import prettytable
     pt = prettytable.PrettyTable(fields, caching=False)
     pt.align = 'l'
     data_fields_tbl = {}
@@ -71,11 +222,7 @@ def print_list(data, field, fields=None, formatters={}):
             if field in formatters:
                 row.append(formatters[field](o))
             else:
-                field_name = field.lower().replace(' ', '_')
-                if isinstance(o, dict):
-                    data = get_value_ignorecase(o, field_name)
-                else:
-                    data = get_attribute_ignorecase(o, field_name)
+                data = _get_field(o, field, formatters)
                 if data is None:
                     data = ''
                 elif field not in data_fields_tbl:
@@ -90,8 +237,8 @@ def print_list(data, field, fields=None, formatters={}):
 
 
 def print_dict(d, key=None):
-    pt = prettytable.PrettyTable(['Property', 'Value'], caching=False)
-    pt.aligns = ['l', 'l']
+    if hasattr(d, 'to_dict'):
+        d = d.to_dict()
     if not isinstance(d, dict):
         if key is not None:
             d = getattr(d, key, {})
@@ -105,6 +252,19 @@ def print_dict(d, key=None):
     else:
         if key is not None:
             d = d.get(key, {})
+    if _output_format in ('json', 'jsonl'):
+        import json
+        print json.dumps(d, default=_json_default)
+        return
+    if _output_format != 'table':
+        writer = _get_writer(_output_format)
+        writer.writerow(['Property', 'Value'])
+        for k in sorted(d):
+            writer.writerow([_to_cell(k), _to_cell(d[k])])
+        return
+    import prettytable
+    pt = prettytable.PrettyTable(['Property', 'Value'], caching=False)
+    pt.aligns = ['l', 'l']
     for r in d.iteritems():
         row = list(r)
         pt.add_row(row)
@@ -142,6 +302,7 @@ def import_versioned_module(version, submodule=None):
 
 
 def urlencode(data):
+    import urllib
     assert(isinstance(data, dict))
     kw_list = []
     for k in data.keys():
@@ -243,10 +404,12 @@ def ensure_bool(s):
 
 
 def url_quote(s):
+    import urllib
     return urllib.quote(s)
 
 
 def url_join(*args):
+    import urllib
     args = map(ensure_ascii, args)
     args = map(urllib.quote, args)
     return '/'.join(args)
@@ -293,5 +456,6 @@ def expect(expected_key):
                 return val
             else:
                 return val[expected_key]
+        wrapper.__wrapped__ = func
         return wrapper
     return decorator
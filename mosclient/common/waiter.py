@@ -0,0 +1,93 @@
+import time
+
+
+class WaitResult(object):
+    """Outcome of a Waiter.
+
+    :ivar states: key -> last observed state (None when not found)
+    :ivar done: keys that reached a target state
+    :ivar failed: keys that reached a failure state
+    :ivar pending: keys still not done when the timeout expired
+    """
+
+    def __init__(self, states, done, failed, pending):
+        self.states = states
+        self.done = done
+        self.failed = failed
+        self.pending = pending
+
+    @property
+    def ok(self):
+        return not self.failed and not self.pending
+
+    def __str__(self):
+        return 'Total: %d Done: %d Failed: %d Pending: %d' % \
+            (len(self.states), len(self.done), len(self.failed),
+             len(self.pending))
+
+
+class Waiter(object):
+    """Poll many resources at once until each reaches a target state.
+
+    Each tick makes one poll(keys) call for all keys still pending, which
+    returns a dict key -> state (keys missing from it are reported as
+    None). The delay between ticks starts at interval and is multiplied
+    by backoff, up to max_interval, for as long as no resource changes
+    state; any change resets it to interval.
+
+    :param poll: function taking a list of keys, returning key -> state
+    :param targets: states that end the wait for a resource
+    :param failures: states that end the wait as failed
+    :param timeout: seconds before giving up on pending resources
+    """
+
+    def __init__(self, poll, targets, failures=(), timeout=600,
+                 interval=2, max_interval=30, backoff=1.5, callback=None):
+        self.poll = poll
+        self.targets = frozenset(targets)
+        self.failures = frozenset(failures)
+        self.timeout = timeout
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.callback = callback
+
+    def wait(self, keys):
+        pending = list(keys)
+        states = dict((k, None) for k in pending)
+        done = []
+        failed = []
+        deadline = time.time() + self.timeout
+        delay = self.interval
+        first = True
+        while pending:
+            observed = self.poll(pending)
+            changed = False
+            still_pending = []
+            for key in pending:
+                state = observed.get(key)
+                if first or state != states[key]:
+                    changed = changed or not first
+                    states[key] = state
+                    if self.callback is not None:
+                        self.callback(key, state)
+                if state in self.targets:
+                    done.append(key)
+                    changed = True
+                elif state in self.failures:
+                    failed.append(key)
+                    changed = True
+                else:
+                    still_pending.append(key)
+            pending = still_pending
+            first = False
+            if not pending:
+                break
+            if changed:
+                delay = self.interval
+            now = time.time()
+            if now >= deadline:
+                break
+            time.sleep(min(delay, deadline - now))
+            delay = min(self.max_interval, delay * self.backoff)
+        return WaitResult(states, done, failed, pending)
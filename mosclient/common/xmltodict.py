@@ -2,8 +2,6 @@
 "Makes working with XML feel like you are working with JSON"
 
 from xml.parsers import expat
-from xml.sax.saxutils import XMLGenerator
-from xml.sax.xmlreader import AttributesImpl
 try: # pragma no cover
     from cStringIO import StringIO
 except ImportError: # pragma no cover
@@ -205,11 +203,68 @@ def parse(xml_input, encoding='utf-8', expat=expat, *args, **kwargs):
         parser.Parse(xml_input, True)
     return handler.item
 
+def iterparse(xml_input, item_depth, chunk_size=65536, encoding='utf-8',
+              expat=expat, **kwargs):
+    """Incrementally parse `xml_input` and yield `(path, item)` pairs.
+
+    Works like `parse` in streaming mode, but instead of calling back it
+    reads `xml_input` (a file-like object) `chunk_size` bytes at a time,
+    feeds expat and yields every item found at `item_depth` as soon as
+    its end tag has been parsed. Items are dropped from the parser state
+    once yielded, so memory stays bounded by the largest single item.
+
+        >>> for path, item in xmltodict.iterparse(resp, item_depth=3):
+        ...     print path[-1][0], item
+    """
+    items = []
+
+    def collect(path, item):
+        items.append((list(path), item))
+        return True
+
+    handler = _DictSAXHandler(item_depth=item_depth, item_callback=collect,
+                              **kwargs)
+    parser = expat.ParserCreate()
+    parser.ordered_attributes = True
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    parser.CharacterDataHandler = handler.characters
+    while True:
+        chunk = xml_input.read(chunk_size)
+        if isinstance(chunk, _unicode):
+            chunk = chunk.encode(encoding)
+        parser.Parse(chunk, not chunk)
+        for pair in items:
+            yield pair
+        del items[:]
+        if not chunk:
+            break
+
+def parse_chunks(chunks, encoding='utf-8', expat=expat, **kwargs):
+    """Like `parse`, but fed from an iterable of byte strings, e.g. reads
+    of a response body, so the whole document is never held as one string.
+
+        >>> xmltodict.parse_chunks(iter(lambda: resp.read(65536), ''))
+    """
+    handler = _DictSAXHandler(**kwargs)
+    parser = expat.ParserCreate()
+    parser.ordered_attributes = True
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    parser.CharacterDataHandler = handler.characters
+    for chunk in chunks:
+        if isinstance(chunk, _unicode):
+            chunk = chunk.encode(encoding)
+        parser.Parse(chunk, False)
+    parser.Parse('', True)
+    return handler.item
+
 def _emit(key, value, content_handler,
           attr_prefix='@',
           cdata_key='#text',
           root=True,
           preprocessor=None):
+    from xml.sax.xmlreader import AttributesImpl
     if preprocessor is not None:
         result = preprocessor(key, value)
         if result is None:
@@ -246,6 +301,7 @@ def _emit(key, value, content_handler,
         content_handler.endElement(key)
 
 def unparse(item, output=None, encoding='utf-8', **kwargs):
+    from xml.sax.saxutils import XMLGenerator
     ((key, value),) = item.items()
     must_return = False
     if output == None:
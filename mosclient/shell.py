@@ -4,15 +4,21 @@ Command-line interface to the API server.
 
 
 import sys
+import os
+import errno
+import socket
 import argparse
 import logging
+import collections
+import copy
+import contextlib
+import shlex
+import threading
 
 import client
 
 from common import utils
 
-import urllib2
-
 
 class APIShell(object):
 
@@ -38,6 +44,7 @@ class APIShell(object):
         )
 
         parser.add_argument('--timeout',
+            type=float,
             default=60,
             help='Number of seconds to wait for a response'
         )
@@ -68,62 +75,132 @@ class APIShell(object):
         )
 
         parser.add_argument('--format', choices=['xml', 'json'],
-            default=utils.env('MOS_FORMAT', default='xml'),
+            default=utils.env('MOS_FORMAT', default='json'),
             help='Required return content type'
         )
 
+        parser.add_argument('--output', choices=utils.OUTPUT_FORMATS,
+            default=utils.env('MOS_OUTPUT', default='table'),
+            help='Output format, json, jsonl, csv and tsv stream list rows '
+                 'as each page arrives, defaults to env[MOS_OUTPUT] or table'
+        )
+
+        parser.add_argument('--fields',
+            default=utils.env('MOS_FIELDS', default=None),
+            help='Comma separated columns of list output, e.g. '
+                 'instanceId,status, defaults to env[MOS_FIELDS]'
+        )
+
+        parser.add_argument('--rate-limit',
+            type=float,
+            default=utils.env('MOS_RATE_LIMIT', default=None),
+            help='Max requests per second, defaults to env[MOS_RATE_LIMIT]'
+        )
+
+        parser.add_argument('--rate-limit-file',
+            default=utils.env('MOS_RATE_LIMIT_FILE', default=None),
+            help='File sharing the rate limit between climos processes, '
+                 'defaults to env[MOS_RATE_LIMIT_FILE]'
+        )
+
+        parser.add_argument('--cache-dir',
+            default=utils.env('MOS_CACHE_DIR', default=None),
+            help='Directory caching instance types, templates, zones and '
+                 'other catalogs between runs, defaults to env[MOS_CACHE_DIR]'
+        )
+
+        parser.add_argument('--clear-cache',
+            action='store_true',
+            default=False,
+            help='Drop cached catalogs before running the command'
+        )
+
         return parser
 
-    def get_subcommand_parser(self, version):
+    def get_command_index(self, version):
+        """ Map every subcommand name to its callback
+
+        Only the do_* functions are looked up, no parser is built, so
+        this is cheap enough to run on every invocation.
+        """
+        commands = collections.OrderedDict()
+        submodule = utils.import_versioned_module(version, 'shell')
+        for actions_module in (submodule, self):
+            for attr in (a for a in dir(actions_module)
+                         if a.startswith('do_')):
+                callback = getattr(actions_module, attr)
+                if callable(callback):
+                    commands[attr[3:].replace('_', '-')] = callback
+        return commands
+
+    def get_subcommand_parser(self, version, commands=None):
+        """ Build the parser, with subparsers for the given commands only
+
+        :param commands: names of the subcommands to register, all of them
+                         when None
+        """
         parser = self.get_base_parser()
 
         self.subcommands = {}
         subparsers = parser.add_subparsers(metavar='<subcommand>')
-        submodule = utils.import_versioned_module(version, 'shell')
-        self._find_actions(subparsers, submodule)
-        self._find_actions(subparsers, self)
+        index = self.get_command_index(version)
+        if commands is None:
+            commands = index.keys()
+        for command in commands:
+            self._add_subcommand(subparsers, command, index[command])
 
         return parser
 
-    def _find_actions(self, subparsers, actions_module):
-        for attr in (a for a in dir(actions_module) if a.startswith('do_')):
-            callback = getattr(actions_module, attr)
-            if callable(callback):
-                command = attr[3:].replace('_', '-')
-                desc = callback.__doc__ or ''
-                help = desc.strip().split('\n')[0]
-                arguments = getattr(callback, 'arguments', [])
-
-                subparser = subparsers.add_parser(command,
-                    help=help,
-                    description=desc,
-                    add_help=False,
-                    formatter_class=HelpFormatter,
-                )
-                subparser.add_argument('-h', '--help',
-                    action='help',
-                    help=argparse.SUPPRESS,
-                )
-                self.subcommands[command] = subparser
-                _args = []
-                for (args, kwargs) in arguments:
-                    for item in args:
-                        _args.append(item)
-                    subparser.add_argument(*args, **kwargs)
-                subparser.set_defaults(func=callback)
-                #self.command_dict.setdefault(command, _args)
+    def _add_subcommand(self, subparsers, command, callback):
+        desc = callback.__doc__ or ''
+        help = desc.strip().split('\n')[0]
+        arguments = getattr(callback, 'arguments', [])
+
+        subparser = subparsers.add_parser(command,
+            help=help,
+            description=desc,
+            add_help=False,
+            formatter_class=HelpFormatter,
+        )
+        subparser.add_argument('-h', '--help',
+            action='help',
+            help=argparse.SUPPRESS,
+        )
+        self.subcommands[command] = subparser
+        for (args, kwargs) in arguments:
+            subparser.add_argument(*args, **kwargs)
+        subparser.set_defaults(func=callback)
+
+    @staticmethod
+    def _get_command(args):
+        """ First positional argument left over by the base parser """
+        for arg in args:
+            if not arg.startswith('-'):
+                return arg
+        return None
 
     def main(self, argv):
         parser = self.get_base_parser()
         (options, args) = parser.parse_known_args(argv)
         api_version = options.mos_api_version
-        subcommand_parser = self.get_subcommand_parser(api_version)
-        self.parser = subcommand_parser
+        self.api_version = api_version
+        self.options = options
+        self.commands = self.get_command_index(api_version)
 
         if options.help or not argv:
             self.do_help(options)
             return 0
 
+        # only build the invoked subcommand, unknown ones get the full
+        # parser so that argparse lists the valid choices
+        command = self._get_command(args)
+        if command in self.commands:
+            subcommand_parser = self.get_subcommand_parser(api_version,
+                                                           [command])
+        else:
+            subcommand_parser = self.get_subcommand_parser(api_version)
+        self.parser = subcommand_parser
+
         args = subcommand_parser.parse_args(argv)
 
         if args.func == self.do_help:
@@ -145,21 +222,84 @@ class APIShell(object):
         if args.debug:
             logger = logging.getLogger()
             logger.setLevel(logging.DEBUG)
+        utils.set_output_format(args.output)
+        if args.fields:
+            utils.set_output_fields([f.strip() for f in args.fields.split(',')
+                                     if f.strip()])
+        rate_limiter = None
+        if args.rate_limit:
+            from common import ratelimit
+            backend = None
+            if args.rate_limit_file:
+                backend = ratelimit.FileBackend(args.rate_limit_file)
+            rate_limiter = ratelimit.RateLimiter(float(args.rate_limit),
+                                                 backend=backend)
+        response_cache = None
+        if args.cache_dir:
+            from common import cache
+            response_cache = cache.ResponseCache(path=args.cache_dir)
+            if args.clear_cache:
+                response_cache.invalidate()
         clt = client.Client(api_version,
                             args.mos_access, args.mos_secret, args.mos_url,
                             region=args.mos_region,
                             format=args.format,
                             timeout=args.timeout,
-                            debug=args.debug)
+                            debug=args.debug,
+                            rate_limiter=rate_limiter,
+                            cache=response_cache)
+
+        if not self.run_command(clt, args):
+            sys.exit(-1)
+
+    def run_command(self, clt, args):
+        """ Run a parsed subcommand, print its error if it fails
 
+        :returns: True on success, False if it failed, HTTP errors included
+        """
         try:
-            args.func(clt, args)
+            with clt.errors_raised():
+                args.func(clt, args)
         except Exception as e:
+            if _is_broken_pipe(e):
+                raise
+            import urllib2
             if not isinstance(e, urllib2.HTTPError):
                 print '%s: %s' % (e.__class__.__name__, e)
             else:
                 print self.get_httperror(e, args.debug)
-            sys.exit(-1)
+            return False
+        return True
+
+    def run_line(self, clt, line, parsers):
+        """ Parse and run one line of climos shell or climos batch
+
+        Global options given to climos apply to every line, the line
+        itself only holds the subcommand and its arguments.
+
+        :param parsers: subcommand name -> parser, filled in as needed
+        :returns: True on success
+        """
+        argv = shlex.split(line, comments=True)
+        if not argv:
+            return True
+        command = argv[0]
+        if command not in self.commands or command in ('shell', 'batch'):
+            print "'%s' is not a valid subcommand" % command
+            return False
+        parser = parsers.get(command)
+        if parser is None:
+            parser = self.get_subcommand_parser(self.api_version, [command])
+            parsers[command] = parser
+        try:
+            args = parser.parse_args(argv, namespace=copy.copy(self.options))
+            if args.func == self.do_help:
+                self.do_help(args)
+                return True
+            return self.run_command(clt, args)
+        except SystemExit as e:
+            # argparse errors and commands giving up with sys.exit()
+            return not e.code
 
     def get_httperror(self, e, debug):
         details = e.read()
@@ -188,6 +328,102 @@ class APIShell(object):
             details = str(details)
         return '%s(%d): %s' % (e.msg, e.code, details)
 
+    def do_shell(self, clt, args):
+        """
+        Read commands interactively, reusing one client and its connections.
+        """
+        try:
+            import readline
+        except ImportError:
+            pass
+        parsers = {}
+        while True:
+            try:
+                line = raw_input('climos> ')
+            except EOFError:
+                print
+                break
+            except KeyboardInterrupt:
+                print
+                continue
+            if line.strip() in ('exit', 'quit'):
+                break
+            try:
+                self.run_line(clt, line, parsers)
+            except KeyboardInterrupt:
+                print
+
+    @utils.arg('file', metavar='<FILE>',
+               help='File with one subcommand per line, - for stdin')
+    @utils.arg('--workers', metavar='<WORKERS>', type=int, default=10,
+               help='Lines run concurrently, defaults to 10')
+    @utils.arg('--echo', action='store_true', default=False,
+               help='Print each line before its output')
+    def do_batch(self, clt, args):
+        """
+        Run the subcommands of a file, concurrently, with one client.
+
+        Independent lines run on up to --workers threads, their output is
+        printed in file order. A line reading "sync" waits for every line
+        above it to finish before the lines below it start.
+        """
+        from common.futures import ThreadPoolExecutor
+        if args.file == '-':
+            lines = sys.stdin
+        else:
+            lines = open(args.file)
+        parsers = {}
+        executor = ThreadPoolExecutor(max(1, args.workers))
+        pending = collections.deque()
+        failed = [0]
+
+        def run(line):
+            with output.capture() as buf:
+                ok = self.run_line(clt, line, parsers)
+            return buf.getvalue(), ok
+
+        def flush(block):
+            while pending and (block or pending[0][1].done()):
+                line, future = pending.popleft()
+                text, ok = future.result()
+                if args.echo:
+                    output.write('>>> %s\n' % line)
+                output.write(text)
+                output.flush()
+                if not ok:
+                    failed[0] += 1
+
+        streams = sys.stdout, sys.stderr
+        output = _CapturedOutput.install()
+        try:
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line == 'sync':
+                    flush(True)
+                    continue
+                # build parsers here rather than racing in the workers
+                command = shlex.split(line, comments=True)[:1]
+                if command and command[0] in self.commands and \
+                        command[0] not in parsers:
+                    parsers[command[0]] = self.get_subcommand_parser(
+                        self.api_version, command)
+                pending.append((line, executor.submit(run, line)))
+                # bound the output held back by a slow earlier line
+                if len(pending) > args.workers * 4:
+                    pending[0][1].result()
+                flush(False)
+            flush(True)
+        finally:
+            sys.stdout, sys.stderr = streams
+            executor.shutdown(wait=False)
+            if lines is not sys.stdin:
+                lines.close()
+        if failed[0]:
+            print '**** Failed: %d ****' % failed[0]
+            sys.exit(1)
+
     @utils.arg('command', metavar='<subcommand>', nargs='?',
                help='Display help for <subcommand>')
     def do_help(self, args):
@@ -195,13 +431,56 @@ class APIShell(object):
         Display help about this program or one of its subcommands.
         """
         if getattr(args, 'command', None):
-            if args.command in self.subcommands:
+            if args.command in self.commands:
+                self.get_subcommand_parser(self.api_version, [args.command])
                 self.subcommands[args.command].print_help()
             else:
                 raise Exception("'%s' is not a valid subcommand" %
                                        args.command)
         else:
-            self.parser.print_help()
+            self.get_subcommand_parser(self.api_version).print_help()
+
+
+class _CapturedOutput(object):
+    """ Stand-in for sys.stdout and sys.stderr that sends what a thread
+    writes inside capture() to a buffer of that thread """
+
+    def __init__(self, stream, local):
+        self._stream = stream
+        self._local = local
+
+    @classmethod
+    def install(cls):
+        if not isinstance(sys.stdout, cls):
+            local = threading.local()
+            sys.stdout = cls(sys.stdout, local)
+            sys.stderr = cls(sys.stderr, local)
+        return sys.stdout
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode(getattr(self._stream, 'encoding', None) or
+                               'utf-8')
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None:
+            self._stream.write(data)
+        else:
+            buf.write(data)
+
+    def flush(self):
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    @contextlib.contextmanager
+    def capture(self):
+        from cStringIO import StringIO
+        self._local.buffer = buf = StringIO()
+        try:
+            yield buf
+        finally:
+            self._local.buffer = None
 
 
 class HelpFormatter(argparse.HelpFormatter):
@@ -211,6 +490,20 @@ class HelpFormatter(argparse.HelpFormatter):
         super(HelpFormatter, self).start_section(heading)
 
 
+def _is_broken_pipe(e):
+    """ Whether e is a write to a closed stdout, e.g. climos ... | head """
+    return isinstance(e, IOError) and e.errno == errno.EPIPE and \
+        not isinstance(e, socket.error)
+
+
 def main():
     api_shell = APIShell()
-    api_shell.main(sys.argv[1:])
+    try:
+        api_shell.main(sys.argv[1:])
+    except IOError as e:
+        if not _is_broken_pipe(e):
+            raise
+        # the reader is gone, keep the flush at exit from failing again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
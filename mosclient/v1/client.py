@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
-import json
 
 import re
 
+from functools import wraps
+
 from mosclient.common import utils
+from mosclient.common.actions import register_actions
 from mosclient.common.client import BaseClient
+from mosclient.common.futures import ThreadPoolExecutor
+from mosclient.common.waiter import Waiter
+from mosclient.v1 import records
 
 
 def match_duration(string):
@@ -24,14 +29,57 @@ class Client(BaseClient):
     :type secret: string
     :param url: MOS API访问URL
     :type url: string
-    :param format: 指定返回数据格式xml或者json，缺省为xml
+    :param format: 指定返回数据格式xml或者json，缺省为json，服务端不支持json时自动使用xml
     :type format: string
     :param timeout: 超时秒数，缺省为300秒
     :type timeout: int
     :param debug: 是否输出debug信息，缺省为False
     :type debug: bool
+    :param region: 区域，缺省为Beijing
+    :type region: string
+    :param keepalive: 是否复用HTTP(S)长连接，缺省为True
+    :type keepalive: bool
+    :param pool_size: 每个host最多保留的空闲连接数，缺省为10
+    :type pool_size: int
+    :param idle_timeout: 空闲连接超过该秒数后关闭，缺省为60秒
+    :type idle_timeout: int
+    :param transport: 自定义请求发送层，缺省根据keepalive选择
+    :type transport: mosclient.common.transport.Transport
+    :param records: 是否将列表结果中的各项(Instance, Volume等)解析为
+                    :mod:`mosclient.v1.records` 中的紧凑对象，缺省为False
+    :type records: bool
+    :param retry: 失败请求的重试策略，缺省对只读请求的429/502/503/504及网络错误、
+                  写操作的429及带Retry-After的503最多尝试3次，False表示不重试
+    :type retry: mosclient.common.retry.RetryPolicy
+    :param rate_limiter: 客户端限速器，可在线程间或通过文件在进程间共享
+    :type rate_limiter: mosclient.common.ratelimit.RateLimiter
+    :param raise_errors: HTTP错误时抛出urllib2.HTTPError而不是打印错误并返回None，
+                         缺省为False
+    :type raise_errors: bool
+    :param cache: 缓存类型、模板、可用区等几乎不变的目录类查询结果，True表示使用
+                  内存缓存，也可传入指定磁盘目录的ResponseCache，缺省不缓存
+    :type cache: mosclient.common.cache.ResponseCache
+    :param metrics: 记录各Action的延迟直方图、收发字节数、解析耗时和错误数，
+                    True表示新建一个MetricsCollector，可通过client.metrics导出为
+                    dict或Prometheus文本格式，缺省不记录
+    :type metrics: mosclient.common.metrics.MetricsCollector
+    :param coalesce: 多个线程同时发出相同的只读请求(Action和参数均相同)时只发送一次，
+                     结果的副本返回给所有调用者，缺省为False
+    :type coalesce: bool
     """
 
+    record_types = records.RECORD_TYPES
+
+    cache_ttls = {
+        'DescribeInstanceTypes': 3600,
+        'DescribeTemplates': 600,
+        'DescribeAvailabilityZones': 3600,
+        'DescribeRDSTypes': 3600,
+        'DescribeRDSEngines': 3600,
+        'DescribeBDSTypes': 3600,
+        'DescribeSDSTypes': 3600,
+    }
+
     def DescribeInstanceTypes(self, limit=0, offset=0, filters=None):
         """ 获取所有虚拟机类型
 
@@ -319,6 +367,112 @@ class Client(BaseClient):
         kwargs['InstanceId'] = iid
         self.request(**kwargs)
 
+    def start_instances(self, ids, workers=10):
+        """ 并发启动多个虚拟机
+
+        :param ids: 虚拟机ID列表
+        :type ids: list
+        :param workers: 最大并发请求数
+        :type workers: int
+        :returns: BatchSummary，包含每个虚拟机的执行结果或错误
+        """
+        return self.batch(self.StartInstance, ids, workers)
+
+    def stop_instances(self, ids, force=False, workers=10):
+        """ 并发停止多个虚拟机
+
+        :param ids: 虚拟机ID列表
+        :type ids: list
+        :param force: 是否强制停止虚拟机
+        :type force: bool
+        :param workers: 最大并发请求数
+        :type workers: int
+        :returns: BatchSummary，包含每个虚拟机的执行结果或错误
+        """
+        return self.batch(self.StopInstance, ids, workers, force=force)
+
+    def reboot_instances(self, ids, workers=10):
+        """ 并发重启多个虚拟机
+
+        :param ids: 虚拟机ID列表
+        :type ids: list
+        :param workers: 最大并发请求数
+        :type workers: int
+        :returns: BatchSummary，包含每个虚拟机的执行结果或错误
+        """
+        return self.batch(self.RebootInstance, ids, workers)
+
+    def terminate_instances(self, ids, workers=10):
+        """ 并发删除多个虚拟机
+
+        :param ids: 虚拟机ID列表
+        :type ids: list
+        :param workers: 最大并发请求数
+        :type workers: int
+        :returns: BatchSummary，包含每个虚拟机的执行结果或错误
+        """
+        return self.batch(self.TerminateInstance, ids, workers)
+
+    def renew_instances(self, ids, duration=None, workers=10):
+        """ 并发续费多个虚拟机
+
+        :param ids: 虚拟机ID列表
+        :type ids: list
+        :param duration: 续费租期，缺省为'1M'，即一个月
+        :type duration: string
+        :param workers: 最大并发请求数
+        :type workers: int
+        :returns: BatchSummary，包含每个虚拟机的执行结果或错误
+        """
+        return self.batch(self.RenewInstance, ids, workers, duration=duration)
+
+    def wait_instances(self, ids, status='running', failures=None,
+                       timeout=600, interval=2, max_interval=30,
+                       callback=None, chunk_size=100):
+        """ 等待多个虚拟机进入指定状态
+
+        每次轮询通过一次DescribeInstances(ids=[...])获取所有未完成虚拟机的状态，
+        状态无变化时轮询间隔按1.5倍递增直至max_interval，有变化时恢复为interval。
+
+        :param ids: 虚拟机ID列表
+        :type ids: list
+        :param status: 目标状态或状态列表，None表示等待虚拟机被删除
+        :type status: string
+        :param failures: 视为失败、不再等待的状态列表
+        :type failures: list
+        :param timeout: 超时秒数，缺省为600秒
+        :type timeout: int
+        :param interval: 初始轮询间隔秒数
+        :type interval: int
+        :param max_interval: 最大轮询间隔秒数
+        :type max_interval: int
+        :param callback: 虚拟机状态变化时调用callback(iid, status)
+        :param chunk_size: 每次DescribeInstances查询的最大ID数量
+        :type chunk_size: int
+        :returns: WaitResult，包含各虚拟机最后状态以及完成、失败、超时的虚拟机列表
+        """
+        if status is None or isinstance(status, basestring):
+            status = [status]
+        targets = [s.lower() if s else None for s in status]
+        failures = [s.lower() for s in (failures or [])]
+
+        def poll(keys):
+            states = {}
+            with self.errors_raised():
+                for i in range(0, len(keys), chunk_size):
+                    chunk = keys[i:i + chunk_size]
+                    val = self.DescribeInstances(ids=chunk, limit=len(chunk))
+                    for item in self.get_list_items(val, 'Instance'):
+                        iid = utils.get_value_ignorecase(item, 'instanceId')
+                        state = utils.get_value_ignorecase(item, 'status')
+                        states[iid] = state.lower() if state else state
+            return states
+
+        waiter = Waiter(poll, targets, failures, timeout=timeout,
+                        interval=interval, max_interval=max_interval,
+                        callback=callback)
+        return waiter.wait(ids)
+
     def RebuildInstanceRootImage(self, iid, image_id=None):
         """ 重置虚拟机系统磁盘
 
@@ -1347,7 +1501,7 @@ class Client(BaseClient):
         kwargs['Cidr'] = cidr
         if desc and not desc.isspace():
             kwargs['Description'] = desc
-        val = self.request(**kwargs)  # 利用sys._getframe(level).f_code.co_name获取动态运行时的函数名, 在ec2/action目录下
+        val = self.request(**kwargs)
         return val
 
     def DeleteVPC(self, vid):
@@ -1377,7 +1531,7 @@ class Client(BaseClient):
         kwargs['Name'] = name
         if desc and not desc.isspace():
             kwargs['Description'] = desc
-        val = self.request(**kwargs)  # 利用sys._getframe(level).f_code.co_name获取动态运行时的函数名, 在ec2/action目录下
+        val = self.request(**kwargs)
         return val
 
     def DescribeVPCs(self, vids=None, limit=0, offset=0, filters=None, zone=None):
@@ -2767,7 +2921,7 @@ class Client(BaseClient):
         kwargs['DLProjectName'] = name
         if desc and not desc.isspace():
             kwargs['Description'] = desc
-        val = self.request(**kwargs)  # 利用sys._getframe(level).f_code.co_name获取动态运行时的函数名, 在ec2/action目录下
+        val = self.request(**kwargs)
         return val
     
     def CreateDLJob(self, project_id, name, hardware_mode, 
@@ -3040,5 +3194,129 @@ class Client(BaseClient):
             kwargs['ImageConfig'] = image_config
         if desc and not desc.isspace():
             kwargs['Description'] = desc
-        val = self.request(**kwargs)  # 利用sys._getframe(level).f_code.co_name获取动态运行时的函数名, 在ec2/action目录下
+        val = self.request(**kwargs)
         return val
+
+
+# paginated list actions and the element name of their items
+LIST_ACTIONS = {
+    'DescribeInstanceTypes': 'InstanceType',
+    'DescribeInstances': 'Instance',
+    'DescribeInstanceVolumes': 'InstanceVolume',
+    'DescribeInstanceNetworkInterfaces': 'InstanceNetworkInterface',
+    'DescribeKeyPairs': 'KeyPair',
+    'DescribeAlarmHistory': 'AlarmHistory',
+    'DescribeSecurityGroups': 'SecurityGroup',
+    'DescribeAvailabilityZones': 'AvailabilityZone',
+    'DescribeRedis': 'Redis',
+    'DescribeRDS': 'RDS',
+    'DescribeRDSTypes': 'RDSType',
+    'DescribeVPCs': 'VPC',
+    'DescribeVPCSubnets': 'Subnet',
+    'ListVPCSubnets': 'Subnet',
+    'DescribeAddresses': 'Address',
+    'DescribeVolumes': 'Volume',
+    'DescribeVolumeSnapshots': 'VolumeSnapshot',
+    'DescribeServerGroup': 'ServerGroup',
+    'DescribeServerByGroup': 'GroupGuest',
+    'DescribeECS': 'ECS',
+    'DescribeECSNode': 'RDSNode',
+    'DescribeRDSNode': 'RDSNode',
+    'DescribeSDSystems': 'StreamingSystem',
+    'DescribeBDSystems': 'BigDataSystem',
+    'DescribeBDSTypes': 'BDSType',
+    'DescribeSDSTypes': 'SDSType',
+    'DescribeLoadBalancers': 'LoadBalancer',
+    'DescribeLoadBalancerListeners': 'Listener',
+    'DescribeListenerBackends': 'Backend',
+    'DescribeDLProjects': 'DLProject',
+    'DescribeDLJobs': 'DLJob',
+    'DescribeDLImages': 'DLImage',
+}
+
+
+# list actions accepting a list of IDs and the argument taking it
+ID_LIST_ARGS = {
+    'DescribeInstances': 'ids',
+    'DescribeSecurityGroups': 'ids',
+    'DescribeRedis': 'ids',
+    'DescribeRDS': 'ids',
+    'DescribeVolumes': 'ebs_ids',
+    'DescribeVolumeSnapshots': 'ebs_snapshot_ids',
+    'DescribeAddresses': 'allocation_ids',
+    'DescribeVPCSubnets': 'subnets_ids',
+    'DescribeLoadBalancers': 'ids',
+}
+
+
+register_actions(Client, LIST_ACTIONS, ID_LIST_ARGS)
+
+
+def _iter_action(name, item_key):
+    def wrapper(self, *args, **kwargs):
+        return self.paginate(getattr(self, name), item_key, *args, **kwargs)
+    wrapper.__name__ = 'iter_%s' % name
+    wrapper.__doc__ = u""" 逐条返回%s的全部%s，按需逐页请求，直到Total为止
+
+        参数与%s相同，limit作为每页数量，另可指定page_size(缺省100)，
+        以及workers(并发请求的最大页数，缺省为1即逐页顺序请求)
+        """ % (name, item_key, name)
+    return wrapper
+
+
+for _spec in Client.actions.values():
+    if _spec.item_key is not None:
+        setattr(Client, 'iter_%s' % _spec.name,
+                _iter_action(_spec.name, _spec.item_key))
+
+
+class AsyncClient(object):
+    """
+    MCS API 异步客户端 (v1)
+
+    与Client具有相同的API方法，但每个方法立即返回一个
+    :class:`mosclient.common.futures.Future` ，调用其result()获取结果。
+    所有请求在共享的线程池中执行，并复用同一个HTTP(S)长连接池。
+
+    :param workers: 并发执行请求的线程数，缺省为64
+    :type workers: int
+    :param executor: 共享的ThreadPoolExecutor，多个AsyncClient可共用，
+                     close()不会关闭传入的线程池
+    :type executor: ThreadPoolExecutor
+
+    其余参数与Client相同。
+    """
+
+    def __init__(self, *args, **kwargs):
+        workers = kwargs.pop('workers', 64)
+        executor = kwargs.pop('executor', None)
+        kwargs.setdefault('pool_size', workers)
+        self.client = Client(*args, **kwargs)
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(workers)
+        self.executor = executor
+
+    def submit(self, fn, *args, **kwargs):
+        """ 在线程池中执行fn，返回Future """
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def close(self):
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+        self.client.close()
+
+
+def _async_action(name):
+    func = getattr(Client, name).__func__
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        return self.executor.submit(getattr(self.client, name),
+                                    *args, **kwargs)
+    return wrapper
+
+
+for _name, _func in Client.__dict__.items():
+    if _name[:1].isupper() and callable(_func):
+        setattr(AsyncClient, _name, _async_action(_name))
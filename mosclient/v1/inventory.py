@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+本地资源清单
+
+将虚拟机、云硬盘、浮动IP、负载均衡和VPC子网的列表快照到SQLite数据库，
+按ID、名称、可用区、状态以及资源之间的关联(云硬盘→虚拟机，浮动IP→虚拟机/ELB，
+ELB→浮动IP，子网→VPC)建立索引，之后的查询和关联无需再请求API。
+
+    >>> inventory = Inventory(client, 'inventory.db')
+    >>> inventory.refresh(max_age=300)
+    >>> inventory.find('instance', zone='cn-north-1a', status='running')
+    >>> inventory.linked('volume', 'instance', iid)
+"""
+
+import json
+import time
+import sqlite3
+import threading
+
+
+class Resource(object):
+    """ 一类资源的列表Action及索引字段
+
+    索引字段的取值为item中第一个非空的候选字段，字段名不区分大小写。
+
+    :param kind: 资源类型名，如instance
+    :param action: 列表Action，如DescribeInstances
+    :param id_keys: ID的候选字段名
+    :param name_keys: 名称的候选字段名
+    :param links: (关联资源类型, 候选字段名)列表，或返回(关联资源类型, ID)列表
+                  的函数get_links(get)，get(*keys)返回第一个非空的候选字段值
+    """
+
+    zone_keys = ('availabilityZoneId', 'availabilityZone', 'zoneId', 'zone')
+    status_keys = ('status', 'state')
+
+    def __init__(self, kind, action, id_keys, name_keys=('name',), links=()):
+        self.kind = kind
+        self.action = action
+        self.id_keys = id_keys
+        self.name_keys = name_keys
+        self.links = links
+
+    def get_links(self, get):
+        if callable(self.links):
+            return self.links(get)
+        return [(rel, get(*keys)) for rel, keys in self.links]
+
+
+def _address_links(get):
+    target = get('instanceId', 'associatedId', 'associationId')
+    atype = (get('associationType') or '').lower()
+    if atype in ('elb', 'loadbalancer'):
+        return [('loadbalancer', target)]
+    return [('instance', target)]
+
+
+RESOURCES = (
+    Resource('instance', 'DescribeInstances',
+             ('instanceId', 'id'), ('instanceName', 'name')),
+    Resource('volume', 'DescribeVolumes',
+             ('volumeId', 'ebsId', 'id'), ('volumeName', 'name'),
+             [('instance', ('instanceId', 'attachedInstanceId'))]),
+    Resource('address', 'DescribeAddresses',
+             ('allocationId', 'id'), ('name', 'ipAddress'),
+             _address_links),
+    Resource('loadbalancer', 'DescribeLoadBalancers',
+             ('loadBalancerId', 'elbId', 'id'), ('loadBalancerName', 'name'),
+             [('address', ('allocationId', 'addressId'))]),
+    Resource('subnet', 'DescribeVPCSubnets',
+             ('subnetId', 'id'), ('subnetName', 'name'),
+             [('vpc', ('vpcId',))]),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resources (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    zone TEXT,
+    status TEXT COLLATE NOCASE,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS resources_id ON resources (id);
+CREATE INDEX IF NOT EXISTS resources_name ON resources (kind, name);
+CREATE INDEX IF NOT EXISTS resources_zone ON resources (kind, zone);
+CREATE INDEX IF NOT EXISTS resources_status ON resources (kind, status);
+CREATE TABLE IF NOT EXISTS links (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    rel TEXT NOT NULL,
+    target TEXT NOT NULL,
+    PRIMARY KEY (kind, rel, target, id)
+);
+CREATE INDEX IF NOT EXISTS links_id ON links (kind, id);
+CREATE TABLE IF NOT EXISTS snapshots (
+    kind TEXT PRIMARY KEY,
+    synced REAL NOT NULL,
+    count INTEGER NOT NULL
+);
+"""
+
+
+def _make_getter(item):
+    lower = dict((k.lower(), v) for k, v in item.items())
+
+    def get(*keys):
+        for key in keys:
+            value = lower.get(key.lower())
+            if value not in (None, ''):
+                return value
+    return get
+
+
+def _json_default(obj):
+    to_dict = getattr(obj, 'to_dict', None)
+    if to_dict is not None:
+        return to_dict()
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+class RefreshResult(object):
+    """ 一次刷新中新增、变化、删除及未变化的资源数量 """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.added = 0
+        self.changed = 0
+        self.removed = 0
+        self.unchanged = 0
+
+    def __repr__(self):
+        return '<RefreshResult %s added=%d changed=%d removed=%d ' \
+            'unchanged=%d>' % (self.kind, self.added, self.changed,
+                               self.removed, self.unchanged)
+
+
+class Inventory(object):
+    """
+    资源清单，SQLite快照及查询
+
+    :param client: mosclient.v1.client.Client
+    :param path: SQLite数据库文件路径，缺省为内存数据库
+    :type path: string
+    :param resources: 快照的资源类型，缺省为RESOURCES
+    """
+
+    def __init__(self, client, path=':memory:', resources=RESOURCES):
+        self.client = client
+        self.resources = dict((r.kind, r) for r in resources)
+        self.kinds = [r.kind for r in resources]
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            # readers in other processes are not blocked by a refresh
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _get_resource(self, kind):
+        try:
+            return self.resources[kind]
+        except KeyError:
+            raise ValueError('Unknown resource kind: %s' % kind)
+
+    def _get_action(self, resource):
+        return self.client.actions[resource.action]
+
+    def refresh(self, kinds=None, max_age=None, page_size=100, workers=4):
+        """ 重新获取资源列表并更新快照
+
+        只写入新增和变化的资源，删除列表中已不存在的资源。请求失败时抛出异常，
+        该类型的快照保持不变。分页按offset并发获取，列表期间删除资源会使后续
+        页前移而漏掉资源，因此快照中有而列表中没有的资源会先按ID再查询一次，
+        确认不存在后才删除。
+
+        :param kinds: 刷新的资源类型列表，缺省为全部
+        :type kinds: list
+        :param max_age: 快照未超过该秒数的资源类型不刷新，缺省全部刷新
+        :type max_age: int
+        :param page_size: 每页数量
+        :type page_size: int
+        :param workers: 并发请求的最大页数
+        :type workers: int
+        :returns: dict，资源类型 -> RefreshResult，未刷新的类型不包含在内
+        """
+        results = {}
+        for kind in kinds or self.kinds:
+            resource = self._get_resource(kind)
+            if max_age is not None and self.age(kind) < max_age:
+                continue
+            method = getattr(self.client, 'iter_%s' % resource.action)
+            with self.client.errors_raised():
+                items = list(method(page_size=page_size, workers=workers))
+                items.extend(self._fetch_ids(resource,
+                                             self._missing(resource, items),
+                                             page_size))
+            results[kind] = self._store(resource, items, full=True)
+        return results
+
+    def _missing(self, resource, items):
+        """ 快照中有而items中没有的资源ID """
+        listed = set(_make_getter(item)(*resource.id_keys) for item in items)
+        with self._lock:
+            stored = [row[0] for row in self._db.execute(
+                'SELECT id FROM resources WHERE kind = ?', (resource.kind,))]
+        return [rid for rid in stored if rid not in listed]
+
+    def _fetch_ids(self, resource, ids, chunk_size):
+        """ 按ID列表获取资源，不支持ID列表的操作返回空列表 """
+        spec = self._get_action(resource)
+        if spec.ids_arg is None:
+            return []
+        method = getattr(self.client, resource.action)
+        items = []
+        for i in range(0, len(ids), chunk_size):
+            chunk = list(ids[i:i + chunk_size])
+            val = method(limit=len(chunk), **{spec.ids_arg: chunk})
+            items.extend(self.client.get_list_items(val, spec.item_key))
+        return items
+
+    def refresh_ids(self, kind, ids, chunk_size=100):
+        """ 只重新获取指定ID的资源，例如在创建、修改或删除之后
+
+        :param kind: 资源类型
+        :param ids: ID列表，已不存在的资源从快照中删除
+        :type ids: list
+        :param chunk_size: 每次请求的最大ID数量
+        :type chunk_size: int
+        :returns: RefreshResult
+        """
+        resource = self._get_resource(kind)
+        if self._get_action(resource).ids_arg is None:
+            raise ValueError('%s does not take a list of IDs' %
+                             resource.action)
+        with self.client.errors_raised():
+            items = self._fetch_ids(resource, ids, chunk_size)
+        return self._store(resource, items, ids=ids)
+
+    def _store(self, resource, items, full=False, ids=None):
+        """ 写入items，full为True时删除其余资源，否则删除ids中未返回的资源 """
+        kind = resource.kind
+        result = RefreshResult(kind)
+        now = time.time()
+        rows = {}
+        for item in items:
+            get = _make_getter(item)
+            rid = get(*resource.id_keys)
+            if rid is None:
+                continue
+            data = json.dumps(item, sort_keys=True, default=_json_default)
+            links = [(rel, target) for rel, target in resource.get_links(get)
+                     if target not in (None, '')]
+            rows[rid] = (get(*resource.name_keys), get(*resource.zone_keys),
+                         get(*resource.status_keys), data, links)
+
+        with self._lock:
+            db = self._db
+            with db:
+                if full:
+                    query = 'SELECT id, data FROM resources WHERE kind = ?'
+                    stored = dict(db.execute(query, (kind,)))
+                else:
+                    stored = {}
+                    for rid in set(ids or ()) | set(rows):
+                        row = db.execute('SELECT data FROM resources '
+                                         'WHERE kind = ? AND id = ?',
+                                         (kind, rid)).fetchone()
+                        if row is not None:
+                            stored[rid] = row[0]
+                for rid, (name, zone, status, data, links) in \
+                        rows.iteritems():
+                    old = stored.pop(rid, None)
+                    if old == data:
+                        result.unchanged += 1
+                        continue
+                    if old is None:
+                        result.added += 1
+                    else:
+                        result.changed += 1
+                    db.execute('INSERT OR REPLACE INTO resources (kind, id, '
+                               'name, zone, status, data, updated) VALUES '
+                               '(?, ?, ?, ?, ?, ?, ?)',
+                               (kind, rid, name, zone, status, data, now))
+                    db.execute('DELETE FROM links WHERE kind = ? AND id = ?',
+                               (kind, rid))
+                    db.executemany('INSERT OR IGNORE INTO links (kind, id, '
+                                   'rel, target) VALUES (?, ?, ?, ?)',
+                                   [(kind, rid, rel, target)
+                                    for rel, target in links])
+                for rid in stored:
+                    result.removed += 1
+                    db.execute('DELETE FROM resources WHERE kind = ? AND '
+                               'id = ?', (kind, rid))
+                    db.execute('DELETE FROM links WHERE kind = ? AND id = ?',
+                               (kind, rid))
+                if full:
+                    db.execute('INSERT OR REPLACE INTO snapshots (kind, '
+                               'synced, count) VALUES (?, ?, ?)',
+                               (kind, now, len(rows)))
+        return result
+
+    def age(self, kind):
+        """ 资源类型最近一次完整刷新距今的秒数，从未刷新时为无穷大 """
+        with self._lock:
+            row = self._db.execute('SELECT synced FROM snapshots '
+                                   'WHERE kind = ?', (kind,)).fetchone()
+        if row is None:
+            return float('inf')
+        return time.time() - row[0]
+
+    def query(self, sql, *params):
+        """ 执行只读SQL，返回行列表，用于自定义的关联查询 """
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _items(self, sql, params):
+        return [json.loads(row[0]) for row in self.query(sql, *params)]
+
+    def get(self, kind, rid):
+        """ 按ID获取资源，不存在时返回None """
+        items = self._items('SELECT data FROM resources WHERE kind = ? AND '
+                            'id = ?', (kind, rid))
+        if items:
+            return items[0]
+
+    @staticmethod
+    def _where(kind, name, zone, status):
+        sql = ['WHERE kind = ?']
+        params = [kind]
+        for column, value in (('name', name), ('zone', zone),
+                              ('status', status)):
+            if value is not None:
+                sql.append('AND %s = ?' % column)
+                params.append(value)
+        return ' '.join(sql), params
+
+    def find(self, kind, name=None, zone=None, status=None, limit=None):
+        """ 按名称、可用区和状态(不区分大小写)查找资源
+
+        :returns: 资源列表，按ID排序
+        """
+        where, params = self._where(kind, name, zone, status)
+        sql = 'SELECT data FROM resources %s ORDER BY id' % where
+        if limit:
+            sql += ' LIMIT %d' % limit
+        return self._items(sql, params)
+
+    def count(self, kind, name=None, zone=None, status=None):
+        """ 资源数量，条件与find()相同 """
+        where, params = self._where(kind, name, zone, status)
+        return self.query('SELECT COUNT(*) FROM resources %s' % where,
+                          *params)[0][0]
+
+    def linked(self, kind, rel, target):
+        """ 关联到target的kind类资源，例如linked('volume', 'instance', iid)
+        返回挂载到该虚拟机的云硬盘，linked('address', 'loadbalancer', lbid)
+        返回绑定到该ELB的浮动IP """
+        return self._items('SELECT r.data FROM links l JOIN resources r ON '
+                           'r.kind = l.kind AND r.id = l.id WHERE '
+                           'l.rel = ? AND l.target = ? AND l.kind = ? '
+                           'ORDER BY r.id', (rel, target, kind))
+
+    def links(self, kind, rid):
+        """ 资源的关联，(关联资源类型, ID)列表 """
+        return sorted(self.query('SELECT rel, target FROM links WHERE '
+                                 'kind = ? AND id = ?', kind, rid))
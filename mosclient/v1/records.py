@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+v1 资源对象，Client(records=True)时列表结果中的各项以这些类型返回
+"""
+
+from mosclient.common.records import Record
+
+
+class Instance(Record):
+    __slots__ = ()
+
+
+class InstanceType(Record):
+    __slots__ = ()
+
+
+class Template(Record):
+    __slots__ = ()
+
+
+class KeyPair(Record):
+    __slots__ = ()
+
+
+class SecurityGroup(Record):
+    __slots__ = ()
+
+
+class AvailabilityZone(Record):
+    __slots__ = ()
+
+
+class Volume(Record):
+    __slots__ = ()
+
+
+class VolumeSnapshot(Record):
+    __slots__ = ()
+
+
+class Address(Record):
+    __slots__ = ()
+
+
+class VPC(Record):
+    __slots__ = ()
+
+
+class Subnet(Record):
+    __slots__ = ()
+
+
+class Redis(Record):
+    __slots__ = ()
+
+
+class RDS(Record):
+    __slots__ = ()
+
+
+class LoadBalancer(Record):
+    __slots__ = ()
+
+
+class Listener(Record):
+    __slots__ = ()
+
+
+class Backend(Record):
+    __slots__ = ()
+
+
+class DLProject(Record):
+    __slots__ = ()
+
+
+class DLJob(Record):
+    __slots__ = ()
+
+
+class DLImage(Record):
+    __slots__ = ()
+
+
+# element name -> record class
+RECORD_TYPES = dict((cls.__name__, cls) for cls in (
+    Instance, InstanceType, Template, KeyPair, SecurityGroup,
+    AvailabilityZone, Volume, VolumeSnapshot, Address, VPC, Subnet, Redis,
+    RDS, LoadBalancer, Listener, Backend, DLProject, DLJob, DLImage,
+))
@@ -5,12 +5,21 @@ import sys
 from mosclient.common import utils
 
 
+def _list_pages(args, method, *margs, **mkwargs):
+    """ Fetch the page asked for, or with a streaming --output and no
+    --limit iterate over every page so rows print as each one arrives """
+    if utils.get_output_format() == 'table' or args.limit:
+        return method(*margs, **mkwargs)
+    iter_method = getattr(method.__self__, 'iter_%s' % method.__name__)
+    return iter_method(*margs, **mkwargs)
+
+
 @utils.arg('--limit', metavar='<LIMIT>', type=int, help='Limit')
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Limit')
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeInstanceTypes(client, args):
     """ List all instance types """
-    val = client.DescribeInstanceTypes(args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeInstanceTypes, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'InstanceType')
 
 
@@ -92,7 +101,7 @@ def do_GetPasswordData(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeInstances(client, args):
     """ Get details of all or specified instances """
-    val = client.DescribeInstances(args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter), args.group, args.zone)
+    val = _list_pages(args, client.DescribeInstances, args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter), args.group, args.zone)
     utils.print_list(val, 'Instance')
 
 
@@ -111,7 +120,7 @@ def do_SearchAssociatedAddresses(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeInstanceVolumes(client, args):
     """ List all disks of an instance """
-    val = client.DescribeInstanceVolumes(args.id, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeInstanceVolumes, args.id, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'InstanceVolume')
 
 
@@ -121,7 +130,7 @@ def do_DescribeInstanceVolumes(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeInstanceNetworkInterfaces(client, args):
     """ List all network interfaces of an instance """
-    val = client.DescribeInstanceNetworkInterfaces(args.id, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeInstanceNetworkInterfaces, args.id, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'InstanceNetworkInterface')
 
 
@@ -150,6 +159,67 @@ def do_TerminateInstance(client, args):
     client.TerminateInstance(args.id)
 
 
+def _print_batch(summary):
+    utils.print_list(summary.to_list(), None, ['ID', 'STATUS', 'ERROR'])
+    if utils.get_output_format() == 'table':
+        print '****', summary, '****'
+    if not summary.ok:
+        sys.exit(1)
+
+
+@utils.arg('id', metavar='<ID>', nargs='+', help='IDs of instances')
+@utils.arg('--workers', metavar='<WORKERS>', type=int, default=10, help='Max concurrent requests')
+def do_BatchStartInstance(client, args):
+    """ Start many instances concurrently """
+    _print_batch(client.start_instances(args.id, workers=args.workers))
+
+
+@utils.arg('id', metavar='<ID>', nargs='+', help='IDs of instances')
+@utils.arg('--force', action='store_true', help='Force stop running instances')
+@utils.arg('--workers', metavar='<WORKERS>', type=int, default=10, help='Max concurrent requests')
+def do_BatchStopInstance(client, args):
+    """ Stop many instances concurrently """
+    _print_batch(client.stop_instances(args.id, force=args.force,
+                                       workers=args.workers))
+
+
+@utils.arg('id', metavar='<ID>', nargs='+', help='IDs of instances')
+@utils.arg('--workers', metavar='<WORKERS>', type=int, default=10, help='Max concurrent requests')
+def do_BatchRebootInstance(client, args):
+    """ Reboot many instances concurrently """
+    _print_batch(client.reboot_instances(args.id, workers=args.workers))
+
+
+@utils.arg('id', metavar='<ID>', nargs='+', help='IDs of instances')
+@utils.arg('--workers', metavar='<WORKERS>', type=int, default=10, help='Max concurrent requests')
+def do_BatchTerminateInstance(client, args):
+    """ Terminate many instances concurrently """
+    _print_batch(client.terminate_instances(args.id, workers=args.workers))
+
+
+@utils.arg('id', metavar='<ID>', nargs='+', help='IDs of instances')
+@utils.arg('--duration', metavar='<DURATION>', help='Renew instance duration, in H or M, eg 72H, 1M')
+@utils.arg('--workers', metavar='<WORKERS>', type=int, default=10, help='Max concurrent requests')
+def do_BatchRenewInstance(client, args):
+    """ Renew many instances concurrently """
+    _print_batch(client.renew_instances(args.id, duration=args.duration,
+                                        workers=args.workers))
+
+
+@utils.arg('id', metavar='<ID>', nargs='+', help='IDs of instances')
+@utils.arg('--status', metavar='<STATUS>', default='running', help='Target status, defaults to running')
+@utils.arg('--wait-timeout', metavar='<SECONDS>', dest='wait_timeout', type=int, default=600, help='Seconds to wait, defaults to 600')
+def do_WaitInstances(client, args):
+    """ Wait until instances reach a status """
+    def report(iid, status):
+        print '%s: %s' % (iid, status)
+    val = client.wait_instances(args.id, status=args.status,
+                                timeout=args.wait_timeout, callback=report)
+    print '****', val, '****'
+    if not val.ok:
+        sys.exit(1)
+
+
 @utils.arg('id', metavar='<ID>', help='ID of instance')
 @utils.arg('--image', metavar='<IMAGE>', help='ID of root image template')
 def do_RebuildInstanceRootImage(client, args):
@@ -199,7 +269,7 @@ def do_PutInstanceMetadata(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeKeyPairs(client, args):
     """ List all keypairs """
-    val = client.DescribeKeyPairs(args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeKeyPairs, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'KeyPair')
 
 
@@ -236,7 +306,7 @@ def do_DescribeInstanceMetrics(client, args):
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Limit')
 def do_DescribeAlarmHistory(client, args):
     """List monitor alarm history"""
-    val = client.DescribeAlarmHistory(args.limit, args.offset)
+    val = _list_pages(args, client.DescribeAlarmHistory, args.limit, args.offset)
     utils.print_list(val, 'AlarmHistory')
 
 
@@ -378,7 +448,7 @@ def do_CreateSecurityGroup(client, args):
 def do_DescribeSecurityGroups(client, args):
     """ List all security groups """
     #p = utils.convert_filter(args.filter)
-    val = client.DescribeSecurityGroups(args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeSecurityGroups, args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'SecurityGroup')
 
 
@@ -420,7 +490,7 @@ def do_InstanceRevokeSecurityGroup(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeAvailabilityZones(client, args):
     """ List all availability zones """
-    val = client.DescribeAvailabilityZones(args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeAvailabilityZones, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'AvailabilityZone')
 
 
@@ -431,7 +501,7 @@ def do_DescribeAvailabilityZones(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeRedis(client, args):
     """ Get details of all or specified redis """
-    val = client.DescribeRedis(args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeRedis, args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'Redis')
 
 
@@ -556,7 +626,7 @@ def do_CreateRDS(client, args):
 @utils.arg('--zone', metavar='<AvailabilityZoneId>', help='AvailabilityZoneId')
 def do_DescribeRDS(client, args):
     """ Get details of all or specified rds """
-    val = client.DescribeRDS(args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter), args.zone)
+    val = _list_pages(args, client.DescribeRDS, args.id, args.name, args.limit, args.offset, utils.convert_filter(args.filter), args.zone)
     utils.print_list(val, 'RDS')
 
 
@@ -606,7 +676,7 @@ def do_RenewRDS(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeRDSTypes(client, args):
     """ List all rds types """
-    val = client.DescribeRDSTypes(args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeRDSTypes, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'RDSType')
 
 
@@ -707,7 +777,7 @@ def do_UpdateVPC(client, args):
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Offset')
 def do_DescribeVPCs(client, args):
     """Describe VPC list"""
-    val = client.DescribeVPCs(args.id, args.limit, args.offset, zone=args.zone)
+    val = _list_pages(args, client.DescribeVPCs, args.id, args.limit, args.offset, zone=args.zone)
     utils.print_list(val, 'VPC')
 
 
@@ -755,7 +825,7 @@ def do_UpdateVPCSubnet(client, args):
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Offset')
 def do_DescribeVPCSubnets(client, args):
     """Describe Subnet list"""
-    val = client.DescribeVPCSubnets(args.id, args.limit, args.offset, zone=args.zone)
+    val = _list_pages(args, client.DescribeVPCSubnets, args.id, args.limit, args.offset, zone=args.zone)
     utils.print_list(val, 'Subnet')
 
 
@@ -764,7 +834,7 @@ def do_DescribeVPCSubnets(client, args):
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Offset')
 def do_ListVPCSubnets(client, args):
     """ List VPC Subnets """
-    val = client.ListVPCSubnets(args.vid, args.limit, args.offset)
+    val = _list_pages(args, client.ListVPCSubnets, args.vid, args.limit, args.offset)
     utils.print_list(val, 'Subnet')
 
 
@@ -807,7 +877,7 @@ def do_ConfigAddressBandwidth(client, args):
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Offset')
 def do_DescribeAddresses(client, args):
     """Describe EIP list"""
-    val = client.DescribeAddresses(args.id, args.limit, args.offset, zone=args.zone)
+    val = _list_pages(args, client.DescribeAddresses, args.id, args.limit, args.offset, zone=args.zone)
     utils.print_list(val, 'Address')
 
 
@@ -859,7 +929,7 @@ def do_CreateVolume(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Offset')
 def do_DescribeVolumes(client, args):
     """Describe specific Volume listener info"""
-    val = client.DescribeVolumes(args.ebs_id, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeVolumes, args.ebs_id, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'Volume')
 
 @utils.arg('--ebs_id', metavar='<VolumeId>', required=True, help='ID of Volume')
@@ -889,7 +959,7 @@ def do_DeleteVolume(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Offset')
 def do_DescribeVolumeSnapshots(client, args):
     """Describe specific Volume Snapshot listener info"""
-    val = client.DescribeVolumeSnapshots(args.ebs_snapshot_ids, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeVolumeSnapshots, args.ebs_snapshot_ids, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'VolumeSnapshot')
 
 @utils.arg('--ebs_snapshot_id', metavar='<VolumeSnapshotId>', required=True, help='ID of Volume snapshot')
@@ -914,7 +984,7 @@ def do_DeleteVolumeSnapshot(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Offset')
 def do_DescribeServerGroup(client, args):
     """Describe ServerGroup info"""
-    val = client.DescribeServerGroup(args.servergroup_ids, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeServerGroup, args.servergroup_ids, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'ServerGroup')
 
 @utils.arg('name', metavar='<Name>', help='Name')
@@ -943,7 +1013,7 @@ def do_ReleaseServerGroup(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Offset')
 def do_DescribeServerByGroup(client, args):
     """Describe group instance info"""
-    val = client.DescribeServerByGroup(args.group, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeServerByGroup, args.group, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'GroupGuest')
 
 @utils.arg('instance_id', metavar='<instanceId>', help='instanceId')
@@ -970,7 +1040,7 @@ def do_ServerLeaveGroup(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Offset')
 def do_DescribeECS(client, args):
     """Describe esc instance info"""
-    val = client.DescribeECS(args.ecs, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeECS, args.ecs, args.zone, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'ECS')
 
 @utils.arg('name', metavar='<Name>', help='Name')
@@ -1002,7 +1072,7 @@ def do_DeleteECS(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Offset')
 def do_DescribeECSNode(client, args):
     """Describe esc node instance info"""
-    val = client.DescribeECSNode(args.ecs, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeECSNode, args.ecs, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'RDSNode')
 
 @utils.arg('ecs_id', metavar='<ECS_ID>', help='ECS ID')
@@ -1024,7 +1094,7 @@ def do_DeleteCDSNode(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Offset')
 def do_DescribeRDSNode(client, args):
     """Describe RDS node instance info"""
-    val = client.DescribeRDSNode(args.rds, args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeRDSNode, args.rds, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'RDSNode')
 
 @utils.arg('rds', metavar='<RDS>', help='RDS ID')
@@ -1050,7 +1120,7 @@ def do_CreateRDSNode(client, args):
            help='ORDER:["desc", "asc"]')
 def do_DescribeSDSystems(client, args):
     """List all StreamingSystem."""
-    val = client.DescribeSDSystems(args.id, args.name, args.zone, utils.convert_filter(args.filter),
+    val = _list_pages(args, client.DescribeSDSystems, args.id, args.name, args.zone, utils.convert_filter(args.filter),
                            args.limit, args.offset, args.order_by, args.order)
     utils.print_list(val, 'StreamingSystem')
 
@@ -1066,7 +1136,7 @@ def do_DescribeSDSystems(client, args):
            help='ORDER:["desc", "asc"]')
 def do_DescribeBDSystems(client, args):
     """List all BigDataSystem."""
-    val = client.DescribeBDSystems(args.id, args.name, args.zone, utils.convert_filter(args.filter),
+    val = _list_pages(args, client.DescribeBDSystems, args.id, args.name, args.zone, utils.convert_filter(args.filter),
                            args.limit, args.offset, args.order_by, args.order)
     utils.print_list(val, 'BigDataSystem')
 
@@ -1183,7 +1253,7 @@ def do_CreateSDSystem(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeBDSTypes(client, args):
     """List all BigDataSystem types."""
-    val = client.DescribeBDSTypes(args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeBDSTypes, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'BDSType')
 
 
@@ -1192,7 +1262,7 @@ def do_DescribeBDSTypes(client, args):
 @utils.arg('--filter', metavar='<FILTER>', action='append', help='Filter')
 def do_DescribeSDSTypes(client, args):
     """List all StreamingSystem types."""
-    val = client.DescribeSDSTypes(args.limit, args.offset, utils.convert_filter(args.filter))
+    val = _list_pages(args, client.DescribeSDSTypes, args.limit, args.offset, utils.convert_filter(args.filter))
     utils.print_list(val, 'SDSType')
 
 
@@ -1219,7 +1289,7 @@ def do_DeleteLoadBalancer(client, args):
 @utils.arg('--zone', metavar='<AVAILABILITYZONE>', type=str, help='Availability Zone')
 def do_DescribeLoadBalancers(client, args):
     """List all ELB instances"""
-    val = client.DescribeLoadBalancers(args.id, args.limit, args.offset, args.zone)
+    val = _list_pages(args, client.DescribeLoadBalancers, args.id, args.limit, args.offset, args.zone)
     utils.print_list(val, 'LoadBalancer')
 
 
@@ -1312,7 +1382,7 @@ def do_ConfigLoadBalancerListener(client, args):
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Offset')
 def do_DescribeLoadBalancerListeners(client, args):
     """ List all ELB instances """
-    val = client.DescribeLoadBalancerListeners(args.id, args.limit, args.offset)
+    val = _list_pages(args, client.DescribeLoadBalancerListeners, args.id, args.limit, args.offset)
     utils.print_list(val, 'Listener')
 
 
@@ -1341,7 +1411,7 @@ def do_RegisterBackendWithListener(client, args):
 @utils.arg('--offset', metavar='<OFFSET>', type=int, help='Offset')
 def do_DescribeListenerBackends(client, args):
     """ List all Backends of specify Listener """
-    val = client.DescribeListenerBackends(args.listener_id, args.id, args.limit, args.offset)
+    val = _list_pages(args, client.DescribeListenerBackends, args.listener_id, args.id, args.limit, args.offset)
     utils.print_list(val, 'Backend')
 
 
@@ -1375,7 +1445,7 @@ def do_DeregisterBackendWithListener(client, args):
            help='ORDER:["desc", "asc"]')
 def do_DescribeDLProjects(client, args):
     """List all DeepLearningProjects."""
-    val = client.DescribeDLProjects(args.id, args.name, utils.convert_filter(args.filter),
+    val = _list_pages(args, client.DescribeDLProjects, args.id, args.name, utils.convert_filter(args.filter),
                            args.limit, args.offset, args.order_by, args.order)
     utils.print_list(val, 'DLProject')
 
@@ -1460,7 +1530,7 @@ def do_CreateDLJob(client, args):
            help='ORDER:["desc", "asc"]')
 def do_DescribeDLJobs(client, args):
     """List all DeepLearningJobs of a DLProject."""
-    val = client.DescribeDLJobs(args.project_id, args.id, args.name, utils.convert_filter(args.filter),
+    val = _list_pages(args, client.DescribeDLJobs, args.project_id, args.id, args.name, utils.convert_filter(args.filter),
                            args.limit, args.offset, args.order_by, args.order)
     utils.print_list(val, 'DLJob')
 
@@ -1538,7 +1608,7 @@ def do_StopDLJob(client, args):
            help='ORDER:["desc", "asc"]')
 def do_DescribeDLImages(client, args):
     """List all DeepLearningImages."""
-    val = client.DescribeDLImages(args.id, args.name, utils.convert_filter(args.filter),
+    val = _list_pages(args, client.DescribeDLImages, args.id, args.name, utils.convert_filter(args.filter),
                            args.limit, args.offset, args.order_by, args.order)
     utils.print_list(val, 'DLImage')
 